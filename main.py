@@ -4,31 +4,208 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime, timedelta
+import tkinter.font as tkfont
+from datetime import date, datetime, timedelta
 import sqlite3
+import calendar
 import os
-import win32print
-import win32api
-from collections import Counter
+import io
+from collections import Counter, OrderedDict, namedtuple
+from itertools import islice, product
 import re
 import json
+import csv
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from docx import Document
     from docx.shared import Pt, Cm
     from docx.enum.text import WD_ALIGN_PARAGRAPH
     from docx.oxml.ns import qn
+    # 东亚字体属性名，只解析一次
+    EASTASIA = qn('w:eastAsia')
     DOCX_AVAILABLE = True
 except ImportError:
     DOCX_AVAILABLE = False
     print("警告：未安装python-docx库")
 
+try:
+    import win32print
+    import win32api
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+    print("警告：未安装pywin32库，无法选择打印机")
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 
 # 处方文件保存文件夹
 PRESCRIPTION_FOLDER = "处方记录"
 
+# 智能补全词库缓存文件
+WORD_CACHE_FILE = "wordcache.json"
+
+# 小票文档中的分隔线
+DOCX_SEP_LINE = "─" * 16
+DOCX_SEP_DOUBLE = "=" * 34
+# 打印预览（纯文本小票）中的分隔线
+TEXT_SEP_LINE = "-" * 22
+TEXT_SEP_DOUBLE = "=" * 22
+
+# 小票上处方最多显示的行数，确保单页
+MAX_PRESCRIPTION_LINES = 15
+
+# 打印机名称中包含这些关键字时视为小票打印机
+POS_KEYWORDS = ('pos', '58', 'receipt', 'thermal', '小票', '热敏')
+
+
+def _is_pos_printer(name):
+    low = name.lower()
+    return any(keyword in low for keyword in POS_KEYWORDS)
+
+
+# 打印机列表缓存：枚举打印机较慢（网络打印机尤甚），30秒内重复刷新直接复用
+PRINTER_CACHE_TTL = 30
+_printer_cache = {"ts": 0, "list": []}
+
+
+def _list_printers(force=False):
+    """返回本地和已连接的打印机名称列表（level 4只读取名称，不逐台打开打印机）"""
+    if not WIN32_AVAILABLE:
+        return []
+    if not force and time.monotonic() - _printer_cache["ts"] < PRINTER_CACHE_TTL:
+        return _printer_cache["list"]
+    flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
+    printers = [p["pPrinterName"] for p in win32print.EnumPrinters(flags, None, 4)]
+    _printer_cache["ts"] = time.monotonic()
+    _printer_cache["list"] = printers
+    return printers
+
+# 处方录入表单的一次快照，字段顺序与 SQL_INSERT 的前7列一致
+FormData = namedtuple('FormData', 'name gender age phone diagnosis prescription usage')
+
+
+# 小票上的开方时间只精确到分钟，同一分钟内复用格式化好的字符串
+_minute_cache = {"minute": -1, "text": ""}
+
+
+def _now_minute_str():
+    minute = int(time.time()) // 60
+    if minute != _minute_cache["minute"]:
+        _minute_cache["minute"] = minute
+        _minute_cache["text"] = datetime.now().strftime('%Y-%m-%d %H:%M')
+    return _minute_cache["text"]
+
+
+# 本月第一天（本月记录统计用），只在日期变化时重新计算
+_month_start_cache = {"date": None, "text": ""}
+
+
+def _month_start_str():
+    today = date.today()
+    if today != _month_start_cache["date"]:
+        _month_start_cache["date"] = today
+        _month_start_cache["text"] = today.replace(day=1).isoformat()
+    return _month_start_cache["text"]
+
+
+def _wrap_count(text, width=18):
+    """估算文本在小票上折行后占用的行数（每行约width个字），空文本不占行"""
+    return len(text) // width + 1 if text else 0
+
+# 历史查询每页加载的记录数
+SEARCH_PAGE_SIZE = 500
+# 缓存最近几次查询的第一页结果（保存、删除处方后清空）
+SEARCH_CACHE_SIZE = 16
+
+# 固定的SQL语句：每次执行同一个字符串，命中连接内的语句缓存，不再重复解析
+SQL_INSERT = ("INSERT INTO prescriptions (patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+SQL_GET_BY_ID = ("SELECT patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time "
+                 "FROM prescriptions WHERE id = ?")
+SQL_DELETE = "DELETE FROM prescriptions WHERE id = ?"
+SQL_EXPORT = ("SELECT patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time "
+              "FROM prescriptions ORDER BY create_time DESC")
+# 历史查询页顶部的总记录数和本月记录数
+SQL_COUNT_STATS = ("SELECT (SELECT COUNT(*) FROM prescriptions), "
+                   "(SELECT COUNT(*) FROM prescriptions WHERE create_time >= ?)")
+# 姓名三元组索引：unicode61把连续汉字当作一个词，无法做姓名包含匹配；
+# trigram分词（SQLite 3.34+）可直接按子串匹配，代替全表扫描的LIKE '%...%'
+SQL_CREATE_NAME_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS prescriptions_name_fts USING fts5(
+    patient_name, content='prescriptions', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS prescriptions_name_fts_ai AFTER INSERT ON prescriptions BEGIN
+    INSERT INTO prescriptions_name_fts(rowid, patient_name) VALUES (new.id, new.patient_name);
+END;
+CREATE TRIGGER IF NOT EXISTS prescriptions_name_fts_ad AFTER DELETE ON prescriptions BEGIN
+    INSERT INTO prescriptions_name_fts(prescriptions_name_fts, rowid, patient_name)
+    VALUES ('delete', old.id, old.patient_name);
+END;
+CREATE TRIGGER IF NOT EXISTS prescriptions_name_fts_au AFTER UPDATE OF patient_name ON prescriptions BEGIN
+    INSERT INTO prescriptions_name_fts(prescriptions_name_fts, rowid, patient_name)
+    VALUES ('delete', old.id, old.patient_name);
+    INSERT INTO prescriptions_name_fts(rowid, patient_name) VALUES (new.id, new.patient_name);
+END;
+"""
+# trigram索引只能匹配至少3个字符的子串
+NAME_FTS_MIN_LEN = 3
+# 历史列表只取需要的列，日期和处方摘要直接在SQLite中截取
+SQL_SEARCH_BASE = ("SELECT id, patient_name, gender, age, create_time, substr(create_time, 1, 10) AS create_date, diagnosis, "
+                   "CASE WHEN length(prescription) > 50 THEN substr(prescription, 1, 50) || '...' ELSE prescription END AS summary "
+                   "FROM prescriptions")
+
+
+def _build_search_query(has_start, has_end, has_name, name_clause="patient_name LIKE ?"):
+    """返回(第一页语句, 后续页语句)
+    
+    条件顺序与参数绑定顺序一致：开始日期、结束日期、姓名；后续页再接上一页最后一行的
+    (create_time, create_time, id)。按(create_time, id)定位而不用OFFSET，翻页期间
+    新增或删除记录也不会重复或漏掉行。
+    """
+    where = []
+    if has_start:
+        where.append("create_time >= ?")
+    if has_end:
+        where.append("create_time < ?")
+    if has_name:
+        where.append(name_clause)
+    order = " ORDER BY create_time DESC, id DESC LIMIT ?"
+    first = SQL_SEARCH_BASE + (" WHERE " + " AND ".join(where) if where else "") + order
+    # create_time <= ? 让后续页可以按create_time索引定位起点
+    where.append("create_time <= ? AND (create_time < ? OR id < ?)")
+    return first, SQL_SEARCH_BASE + " WHERE " + " AND ".join(where) + order
+
+
+# 查询条件只有8种组合，模块加载时生成全部语句，键为(有开始日期, 有结束日期, 有姓名)
+SQL_SEARCH_QUERIES = {key: _build_search_query(*key) for key in product((False, True), repeat=3)}
+# 姓名包含匹配走trigram索引的语句，键为(有开始日期, 有结束日期)
+SQL_SEARCH_QUERIES_NAME_FTS = {
+    key: _build_search_query(*key, True, "id IN (SELECT rowid FROM prescriptions_name_fts WHERE prescriptions_name_fts MATCH ?)")
+    for key in product((False, True), repeat=2)}
+
+# 词库分词正则（模块加载时编译一次）
+# 诊断：按标点/空白切分后长度>=2的片段
+_DIAG_RE = re.compile(r'[^，,。、；：:\s\[\]【】]{2,}')
+# 药材：按逗号/顿号/空白切分，截去第一个数字或剂量单位及之后的内容
+_MED_RE = re.compile(r'([^，,、\s\d克g粒片包钱两升]*)[^，,、\s]*')
+
+# 只移动光标或单独按下修饰键时不改变筛选内容，不触发筛选
+_NO_EDIT_KEYSYMS = frozenset(('Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R',
+                              'Left', 'Right', 'Up', 'Down', 'Home', 'End'))
+
 
 class Settings:
+    # 已解析的设置文件：路径 -> (修改时间, 内容字典)，文件未变时不再重复解析
+    _cache = {}
+    
     def __init__(self, settings_file="settings.json"):
         self.settings_file = settings_file
         self.default_doctor = ""
@@ -51,132 +228,207 @@ class Settings:
         self.load_settings()
     
     def load_settings(self):
+        if not os.path.exists(self.settings_file):
+            return
         try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.default_doctor = data.get('default_doctor', '')
-                    self.default_phone = data.get('default_phone', '')
-                    self.smart_completion_enabled = data.get('smart_completion_enabled', True)
-                    
-                    # 加载诊所信息
-                    self.clinic_name = data.get('clinic_name', '')
-                    self.clinic_address = data.get('clinic_address', '')
-                    self.clinic_phone = data.get('clinic_phone', '')
-                    self.clinic_license = data.get('clinic_license', '')
-                    
-                    # 加载压缩参数
-                    self.font_size = data.get('font_size', 9)
-                    self.line_spacing = data.get('line_spacing', 0.85)
-                    self.safety_margin = data.get('safety_margin', 1.5)
-                    self.margin_size = data.get('margin_size', 0.2)
-                    self.empty_ratio = float(data.get('empty_ratio', 4.0))
-        except:
+            mtime = os.stat(self.settings_file).st_mtime
+            cached = Settings._cache.get(self.settings_file)
+            if cached is not None and cached[0] == mtime:
+                data = cached[1]
+            else:
+                with open(self.settings_file, 'rb') as f:
+                    raw = f.read()
+                data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw.decode('utf-8'))
+                Settings._cache[self.settings_file] = (mtime, data)
+            self.default_doctor = data.get('default_doctor', '')
+            self.default_phone = data.get('default_phone', '')
+            self.smart_completion_enabled = data.get('smart_completion_enabled', True)
+            
+            # 加载诊所信息
+            self.clinic_name = data.get('clinic_name', '')
+            self.clinic_address = data.get('clinic_address', '')
+            self.clinic_phone = data.get('clinic_phone', '')
+            self.clinic_license = data.get('clinic_license', '')
+            
+            # 加载压缩参数
+            self.font_size = data.get('font_size', 9)
+            self.line_spacing = data.get('line_spacing', 0.85)
+            self.safety_margin = data.get('safety_margin', 1.5)
+            self.margin_size = data.get('margin_size', 0.2)
+            self.empty_ratio = float(data.get('empty_ratio', 4.0))
+        except (OSError, ValueError, TypeError, AttributeError):
+            # 文件无法读取或内容格式不对时保留默认设置
             pass
     
     def save_settings(self):
+        data = {
+            'default_doctor': self.default_doctor,
+            'default_phone': self.default_phone,
+            'smart_completion_enabled': self.smart_completion_enabled,
+            
+            # 保存诊所信息
+            'clinic_name': self.clinic_name,
+            'clinic_address': self.clinic_address,
+            'clinic_phone': self.clinic_phone,
+            'clinic_license': self.clinic_license,
+            
+            # 保存压缩参数
+            'font_size': self.font_size,
+            'line_spacing': self.line_spacing,
+            'safety_margin': self.safety_margin,
+            'margin_size': self.margin_size,
+            'empty_ratio': self.empty_ratio
+        }
+        # 内容与上次读取/写入的文件一致时无需重写
+        cached = Settings._cache.get(self.settings_file)
+        if cached is not None and cached[1] == data and os.path.exists(self.settings_file):
+            return
         try:
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'default_doctor': self.default_doctor,
-                    'default_phone': self.default_phone,
-                    'smart_completion_enabled': self.smart_completion_enabled,
-                    
-                    # 保存诊所信息
-                    'clinic_name': self.clinic_name,
-                    'clinic_address': self.clinic_address,
-                    'clinic_phone': self.clinic_phone,
-                    'clinic_license': self.clinic_license,
-                    
-                    # 保存压缩参数
-                    'font_size': self.font_size,
-                    'line_spacing': self.line_spacing,
-                    'safety_margin': self.safety_margin,
-                    'margin_size': self.margin_size,
-                    'empty_ratio': self.empty_ratio
-                }, f, ensure_ascii=False, indent=2)
+            if ORJSON_AVAILABLE:
+                # orjson直接输出UTF-8字节，中文不转义，效果同ensure_ascii=False
+                with open(self.settings_file, 'wb') as f:
+                    f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            else:
+                with open(self.settings_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            Settings._cache[self.settings_file] = (os.stat(self.settings_file).st_mtime, data)
         except Exception as e:
             print(f"保存设置失败：{e}")
 
 
 class ContextMenu:
-    def __init__(self, widget):
-        self.widget = widget
-        self.menu = tk.Menu(widget, tearoff=0, font=("Microsoft YaHei", 9))
-        self.menu.add_command(label="撤销", command=self.undo, accelerator="Ctrl+Z")
-        self.menu.add_separator()
-        self.menu.add_command(label="剪切", command=self.cut, accelerator="Ctrl+X")
-        self.menu.add_command(label="复制", command=self.copy, accelerator="Ctrl+C")
-        self.menu.add_command(label="粘贴", command=self.paste, accelerator="Ctrl+V")
-        self.menu.add_command(label="删除", command=self.delete, accelerator="Delete")
-        self.menu.add_separator()
-        self.menu.add_command(label="全选", command=self.select_all, accelerator="Ctrl+A")
-        self.widget.bind("<Button-3>", self.show_menu)
-    
-    def show_menu(self, event):
+    """输入框右键菜单：所有输入框共用一个菜单和一个绑定标签，菜单命令作用于弹出菜单时的控件"""
+    _menu = None
+    _widget = None
+    
+    @classmethod
+    def attach(cls, widget):
+        if cls._menu is None:
+            menu = tk.Menu(widget.nametowidget("."), tearoff=0, font=("Microsoft YaHei", 9))
+            menu.add_command(label="撤销", command=cls.undo, accelerator="Ctrl+Z")
+            menu.add_separator()
+            menu.add_command(label="剪切", command=cls.cut, accelerator="Ctrl+X")
+            menu.add_command(label="复制", command=cls.copy, accelerator="Ctrl+C")
+            menu.add_command(label="粘贴", command=cls.paste, accelerator="Ctrl+V")
+            menu.add_command(label="删除", command=cls.delete, accelerator="Delete")
+            menu.add_separator()
+            menu.add_command(label="全选", command=cls.select_all, accelerator="Ctrl+A")
+            cls._menu = menu
+            widget.bind_class("ContextMenu", "<Button-3>", cls.show_menu)
+        widget.bindtags(("ContextMenu",) + widget.bindtags())
+    
+    @classmethod
+    def show_menu(cls, event):
+        cls._widget = event.widget
         try:
-            self.widget.focus_set()
-            self.menu.tk_popup(event.x_root, event.y_root)
+            cls._widget.focus_set()
+            cls._menu.tk_popup(event.x_root, event.y_root)
         finally:
-            self.menu.grab_release()
+            cls._menu.grab_release()
     
-    def undo(self):
+    @classmethod
+    def undo(cls):
+        widget = cls._widget
         try:
-            if isinstance(self.widget, tk.Text):
-                self.widget.edit_undo()
+            if isinstance(widget, tk.Text):
+                widget.edit_undo()
             else:
-                self.widget.event_generate("<<Undo>>")
-        except:
+                widget.event_generate("<<Undo>>")
+        except tk.TclError:
             pass
     
-    def cut(self):
+    @classmethod
+    def cut(cls):
         try:
-            self.widget.event_generate("<<Cut>>")
-        except:
+            cls._widget.event_generate("<<Cut>>")
+        except tk.TclError:
             pass
     
-    def copy(self):
+    @classmethod
+    def copy(cls):
         try:
-            self.widget.event_generate("<<Copy>>")
-        except:
+            cls._widget.event_generate("<<Copy>>")
+        except tk.TclError:
             pass
     
-    def paste(self):
+    @classmethod
+    def paste(cls):
         try:
-            self.widget.event_generate("<<Paste>>")
-        except:
+            cls._widget.event_generate("<<Paste>>")
+        except tk.TclError:
             pass
     
-    def delete(self):
+    @classmethod
+    def delete(cls):
+        widget = cls._widget
         try:
-            if isinstance(self.widget, tk.Text):
-                if self.widget.tag_ranges("sel"):
-                    self.widget.delete("sel.first", "sel.last")
+            if isinstance(widget, tk.Text):
+                if widget.tag_ranges("sel"):
+                    widget.delete("sel.first", "sel.last")
             else:
-                self.widget.event_generate("<<Clear>>")
-        except:
+                widget.event_generate("<<Clear>>")
+        except tk.TclError:
             pass
     
-    def select_all(self):
+    @classmethod
+    def select_all(cls):
+        widget = cls._widget
         try:
-            if isinstance(self.widget, tk.Text):
-                self.widget.tag_add("sel", "1.0", "end")
-                self.widget.mark_set("insert", "1.0")
+            if isinstance(widget, tk.Text):
+                widget.tag_add("sel", "1.0", "end")
+                widget.mark_set("insert", "1.0")
             else:
-                self.widget.select_range(0, "end")
-                self.widget.icursor("end")
-        except:
+                widget.select_range(0, "end")
+                widget.icursor("end")
+        except tk.TclError:
             pass
 
 
+class _Trie:
+    """前缀树 - 每个节点保存以该前缀开头的词条（保持原有排序）"""
+    __slots__ = ("children", "words")
+    
+    def __init__(self):
+        self.children = {}
+        self.words = []
+    
+    def insert(self, word):
+        node = self
+        for ch in word.lower():
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _Trie()
+            child.words.append(word)
+            node = child
+    
+    def find(self, prefix, limit=50):
+        node = self
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.words[:limit]
+
+
 class SmartCompletionPanel:
-    def __init__(self, parent, db_file, settings, on_select_callback=None):
+    def __init__(self, parent, conn, db_file, settings, on_select_callback=None):
         self.parent = parent
+        self.conn = conn
         self.db_file = db_file
         self.settings = settings
         self.on_select_callback = on_select_callback
         self.enabled = tk.BooleanVar(value=settings.smart_completion_enabled)
         self.all_words = []
+        self._loading = False
+        self._reload_pending = False
+        # 后台加载线程及其结果 (counters, categories)，由Tk主线程轮询取回
+        self._load_thread = None
+        self._load_result = None
+        # 关闭窗口时置位，加载线程在下一批记录前退出
+        self._closing = False
+        self._filter_after_id = {}
+        self._worker_conn = None
+        self._counters = None
         self.create_widgets()
         self.load_words_from_database()
     
@@ -198,13 +450,14 @@ class SmartCompletionPanel:
         
         self.notebook = ttk.Notebook(self.main_frame)
         self.notebook.pack(fill="both", expand=True)
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_category_tab_changed)
         
         self.categories = {
-            "常用药材": {"words": []},
-            "常用诊断": {"words": []},
-            "常用处方": {"words": []},
-            "常用用法": {"words": []},
-            "全部词条": {"words": []}
+            "常用药材": {"words": [], "words_lower": (), "trie": _Trie()},
+            "常用诊断": {"words": [], "words_lower": (), "trie": _Trie()},
+            "常用处方": {"words": [], "words_lower": (), "trie": _Trie()},
+            "常用用法": {"words": [], "words_lower": (), "trie": _Trie()},
+            "全部词条": {"words": [], "words_lower": (), "trie": _Trie()}
         }
         
         for cat_name in self.categories:
@@ -217,21 +470,34 @@ class SmartCompletionPanel:
             ttk.Label(search_frame, text="筛选：").pack(side="left")
             search_entry = ttk.Entry(search_frame, width=30)
             search_entry.pack(side="left", padx=5)
-            search_entry.bind('<KeyRelease>', lambda e, cat=cat_name: self.filter_words(cat, e))
+            search_entry.bind('<KeyRelease>', lambda e, cat=cat_name: self._schedule_filter(cat, e))
             self.categories[cat_name]["search"] = search_entry
             
-            canvas_frame = ttk.Frame(frame)
-            canvas_frame.pack(fill="both", expand=True)
-            canvas = tk.Canvas(canvas_frame, height=80, bg="white")
-            scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview)
-            scrollable_frame = ttk.Frame(canvas)
-            scrollable_frame.bind("<Configure>", lambda e, c=canvas: c.configure(scrollregion=c.bbox("all")))
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
+            # 词条用一个只读Text显示，每个词是一段带标签的文本，不再为每个词创建按钮控件
+            text_frame = ttk.Frame(frame)
+            text_frame.pack(fill="both", expand=True)
+            word_text = tk.Text(text_frame, height=4, bg="white", wrap="word", cursor="arrow",
+                relief="flat", padx=4, pady=4, spacing1=2, spacing3=2, takefocus=0)
+            scrollbar = ttk.Scrollbar(text_frame, orient="vertical", command=word_text.yview)
+            word_text.configure(yscrollcommand=scrollbar.set)
+            # 固定宽度的制表位代替原来按词长计算宽度的按钮：6列等宽对齐
+            cell_width = tkfont.nametofont(word_text.cget("font")).measure("中" * 7)
+            word_text.configure(tabs=[cell_width * (i + 1) for i in range(6)], tabstyle="wordprocessor")
+            word_text.tag_configure("word", relief="raised", borderwidth=1, background="#f0f0f0")
+            word_text.tag_configure("hint", foreground="gray", justify="center")
+            word_text.tag_bind("word", "<Enter>", lambda e, t=word_text: t.config(cursor="hand2"))
+            word_text.tag_bind("word", "<Leave>", lambda e, t=word_text: t.config(cursor="arrow"))
+            # 所有词条共用一个点击处理函数，点击时再按位置解析槽位标签
+            word_text.tag_bind("word", "<Button-1>", lambda e, cat=cat_name: self._on_word_tag_click(cat, e))
+            word_text.config(state="disabled")
             scrollbar.pack(side="right", fill="y")
-            canvas.pack(side="left", fill="both", expand=True)
-            self.categories[cat_name]["canvas"] = canvas
-            self.categories[cat_name]["scrollable"] = scrollable_frame
+            word_text.pack(side="left", fill="both", expand=True)
+            self.categories[cat_name]["text"] = word_text
+            self.categories[cat_name]["tags"] = []
+            self.categories[cat_name]["shown"] = []
+            # 上次绘制的 (词条, 空列表提示)，内容相同时跳过重绘
+            self.categories[cat_name]["last_render"] = None
+            self.categories[cat_name]["dirty"] = False
         
         ttk.Label(self.main_frame, text="点击词语可插入到当前输入框",
             foreground="gray").pack(pady=2)
@@ -245,93 +511,262 @@ class SmartCompletionPanel:
             self.notebook.state(['disabled'])
     
     def load_words_from_database(self):
-        self.all_words = []
+        """加载词库：缓存命中时直接显示，否则在后台线程分词，完成后回到Tk主线程更新界面"""
+        if self._loading:
+            self._reload_pending = True
+            return
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT patient_name, diagnosis, prescription, usage, doctor FROM prescriptions")
-            rows = cursor.fetchall()
-            conn.close()
-            
-            medicine_words = Counter()
-            diagnosis_words = Counter()
-            prescription_phrases = Counter()
-            usage_words = Counter()
-            
-            for row in rows:
-                name, diagnosis, prescription, usage, doctor = row
-                if diagnosis:
-                    words = re.split(r'[，,。、；：:；\s\[\]【】]+', diagnosis)
-                    for w in words:
-                        if len(w.strip()) >= 2:
-                            diagnosis_words[w.strip()] += 1
-                
-                if prescription:
-                    lines = prescription.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if line:
-                            parts = re.split(r'[，,、\s]+', line)
-                            for part in parts:
-                                part = part.strip()
-                                part = re.sub(r'\d+.*$', '', part)
-                                part = re.sub(r'[克g粒片包钱两升].*$', '', part)
-                                if 2 <= len(part) <= 6:
-                                    medicine_words[part] += 1
-                            if len(line) >= 4:
-                                prescription_phrases[line] += 1
-                if usage:
-                    usage_words[usage] += 1
-            
-            self.categories["常用药材"]["words"] = [w for w, c in medicine_words.most_common(100)]
-            self.categories["常用诊断"]["words"] = [w for w, c in diagnosis_words.most_common(50)]
-            self.categories["常用处方"]["words"] = [w for w, c in prescription_phrases.most_common(30)]
-            self.categories["常用用法"]["words"] = [w for w, c in usage_words.most_common(20)]
-            all_words = list(medicine_words.keys()) + list(diagnosis_words.keys()) + list(usage_words.keys())
-            self.categories["全部词条"]["words"] = sorted(set(all_words))
+            cursor = self.conn.cursor()
+            # 表的签名（记录数, 最大ID）未变化时直接使用缓存的词库
+            # ID自增且不复用，增删记录都会改变签名
+            cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM prescriptions")
+            signature = list(cursor.fetchone())
+            cached = self._load_word_cache(signature)
+        except Exception as e:
+            print(f"加载词库失败：{e}")
+            return
+        if cached is not None:
+            counters = {name: Counter(counts) for name, counts in cached['counters'].items()}
+            self._apply_categories(counters, cached['categories'])
+            return
+        self._loading = True
+        self._load_result = None
+        self._load_thread = threading.Thread(target=self._load_words_worker, args=(signature,), daemon=True)
+        self._load_thread.start()
+        # 后台线程不调用after()：主循环尚未启动时会抛出RuntimeError，结果由主线程轮询取回
+        self.parent.after(50, self._poll_words_loaded)
+    
+    def _load_words_worker(self, signature):
+        try:
+            self._load_result = self._compute_words(signature)
+        except Exception as e:
+            print(f"加载词库失败：{e}")
+            self._load_result = (None, None)
+    
+    def _poll_words_loaded(self):
+        """Tk主线程中执行：后台加载完成后写回词库，否则稍后再检查"""
+        if self._load_thread.is_alive():
+            self.parent.after(50, self._poll_words_loaded)
+            return
+        counters, categories = self._load_result
+        self._apply_categories(counters, categories)
+    
+    def _compute_words(self, signature):
+        """纯计算部分（后台线程执行）：读取处方并统计各分类词条，不访问任何Tk控件"""
+        # 工作线程使用一条专用连接，首次加载时创建后一直复用（同一时间只有一个加载线程）
+        if self._worker_conn is None:
+            self._worker_conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            # 只读连接：数据页通过内存映射读取，不参与写锁
+            self._worker_conn.executescript(
+                "PRAGMA query_only=ON;"
+                "PRAGMA mmap_size=268435456;"
+                "PRAGMA temp_store=MEMORY;"
+            )
+        cursor = self._worker_conn.cursor()
+        # 用法整段作为词条，直接由SQLite分组计数（可走usage索引）；
+        # 按首次出现的记录排序，与逐行统计时Counter的插入顺序一致
+        cursor.execute(
+            "SELECT usage, COUNT(*) FROM prescriptions WHERE usage != '' "
+            "GROUP BY usage ORDER BY MIN(id)"
+        )
+        usage_counts = Counter(dict(cursor.fetchall()))
+        # 诊断和处方需要分词，只读取这两列；两者都为空的记录不产生任何词条，直接在SQL中过滤掉
+        cursor.execute(
+            "SELECT diagnosis, prescription, NULL FROM prescriptions "
+            "WHERE diagnosis != '' OR prescription != ''"
+        )
+        # 分批读取并累加计数，内存中只保留一批记录而不是整张表
+        counters = None
+        while True:
+            if self._closing:
+                return None, None
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            batch = self._count_words(rows)
+            if counters is None:
+                counters = batch
+            else:
+                for name, counts in batch.items():
+                    counters[name].update(counts)
+        if counters is None:
+            counters = self._count_words([])
+        counters["usage"] = usage_counts
+        categories = self._rank_words(counters)
+        self._save_word_cache(signature, counters, categories)
+        return counters, categories
+    
+    def _count_words(self, rows):
+        """统计 (diagnosis, prescription, usage) 行中各类词条的出现次数"""
+        # 各字段拼接成一个文本块，每类只做一次C层面的正则扫描
+        diagnosis_blob = "\n".join(diagnosis for diagnosis, _, _ in rows if diagnosis)
+        prescription_blob = "\n".join(prescription for _, prescription, _ in rows if prescription)
+        return {
+            "medicine": Counter(w for w in _MED_RE.findall(prescription_blob) if 2 <= len(w) <= 6),
+            "diagnosis": Counter(_DIAG_RE.findall(diagnosis_blob)),
+            "prescription": Counter(line for line in map(str.strip, prescription_blob.split('\n')) if len(line) >= 4),
+            "usage": Counter(usage for _, _, usage in rows if usage)
+        }
+    
+    def _rank_words(self, counters):
+        """根据词频计数生成各分类的显示列表"""
+        medicine_words = counters["medicine"]
+        diagnosis_words = counters["diagnosis"]
+        # 三类词条合并到一个Counter中去重（同一个词的次数相加）；
+        # 全部词条按药材、诊断、用法的首次出现顺序排列，不再做整表排序
+        merged = Counter(medicine_words)
+        merged.update(diagnosis_words)
+        merged.update(counters["usage"])
+        return {
+            "常用药材": [w for w, c in medicine_words.most_common(100)],
+            "常用诊断": [w for w, c in diagnosis_words.most_common(50)],
+            "常用处方": [w for w, c in counters["prescription"].most_common(30)],
+            "常用用法": [w for w, c in counters["usage"].most_common(20)],
+            "全部词条": list(merged)
+        }
+    
+    def add_prescription(self, diagnosis, prescription, usage):
+        """新保存一条处方后增量更新词库，不再重新扫描整张表"""
+        if self._loading or self._counters is None:
+            self.load_words_from_database()
+            return
+        try:
+            for name, counts in self._count_words([(diagnosis, prescription, usage)]).items():
+                self._counters[name].update(counts)
+            categories = self._rank_words(self._counters)
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM prescriptions")
+            self._save_word_cache(list(cursor.fetchone()), self._counters, categories)
+        except Exception as e:
+            print(f"更新词库失败：{e}")
+            return
+        self._apply_categories(self._counters, categories)
+    
+    def _apply_categories(self, counters, categories):
+        """在Tk主线程中写回词库并刷新显示"""
+        self._loading = False
+        if categories is not None:
+            self._counters = counters
+            for cat_name in self.categories:
+                words = categories.get(cat_name, [])
+                self.categories[cat_name]["words"] = words
+                # 小写形式预先算好，子串筛选时不必每次按键都重新转换
+                self.categories[cat_name]["words_lower"] = tuple(w.lower() for w in words)
+                # 每次加载词库时重建前缀树，筛选时按前缀直接定位
+                trie = _Trie()
+                for word in words:
+                    trie.insert(word)
+                self.categories[cat_name]["trie"] = trie
             self.all_words = self.categories["全部词条"]["words"]
             self.stats_label.config(text=f"词库：{len(self.all_words)}个词条")
-            for cat_name in self.categories:
-                self.display_words(cat_name)
+            # 只重绘当前可见的分类，其余分类标记为待刷新，切换到该标签时再绘制
+            for cat in self.categories.values():
+                cat["dirty"] = True
+            self._display_if_dirty(self.notebook.tab(self.notebook.select(), "text"))
+        if self._reload_pending:
+            # 加载期间又有新的刷新请求（例如刚保存了处方），再加载一次
+            self._reload_pending = False
+            self.load_words_from_database()
+    
+    def _load_word_cache(self, signature):
+        """读取词库缓存（词频计数和各分类列表），签名不一致或文件损坏时返回None"""
+        try:
+            with open(WORD_CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('signature') != signature or 'counters' not in data or 'categories' not in data:
+            return None
+        return data
+    
+    def _save_word_cache(self, signature, counters, categories):
+        try:
+            with open(WORD_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'signature': signature,
+                    'counters': counters,
+                    'categories': categories
+                }, f, ensure_ascii=False)
         except Exception as e:
-            print(f"加载词库失败：{e}")
+            print(f"保存词库缓存失败：{e}")
+    
+    def _on_category_tab_changed(self, event):
+        self._display_if_dirty(self.notebook.tab(self.notebook.select(), "text"))
+    
+    def _display_if_dirty(self, category):
+        cat = self.categories.get(category)
+        if cat and cat["dirty"]:
+            cat["dirty"] = False
+            self.display_words(category)
     
     def display_words(self, category):
-        scrollable = self.categories[category]["scrollable"]
-        for widget in scrollable.winfo_children():
-            widget.destroy()
-        words = self.categories[category]["words"]
-        if not words:
-            ttk.Label(scrollable, text="暂无数据，保存处方后将自动学习",
-                foreground="gray").pack(pady=10)
+        self._render_words(category, self.categories[category]["words"],
+            "暂无数据，保存处方后将自动学习")
+    
+    def _schedule_filter(self, category, event):
+        """筛选防抖：连续输入时只在停止输入120ms后执行一次筛选"""
+        if event is not None and event.keysym in _NO_EDIT_KEYSYMS:
             return
-        row_frame = None
-        for i, word in enumerate(words):
-            if i % 6 == 0:
-                row_frame = ttk.Frame(scrollable)
-                row_frame.pack(fill="x", pady=2)
-            btn = tk.Button(row_frame, text=word, width=min(12, max(6, len(word) + 2)),
-                command=lambda w=word: self.on_word_click(w), relief="raised", bd=1)
-            btn.pack(side="left", padx=2, pady=1)
+        pending = self._filter_after_id.get(category)
+        if pending:
+            self.parent.after_cancel(pending)
+        self._filter_after_id[category] = self.parent.after(120, self._do_filter, category, event)
+    
+    def _do_filter(self, category, event):
+        self._filter_after_id[category] = None
+        self.filter_words(category, event)
     
     def filter_words(self, category, event):
-        search_text = self.categories[category]["search"].get().strip().lower()
-        scrollable = self.categories[category]["scrollable"]
-        for widget in scrollable.winfo_children():
-            widget.destroy()
-        all_words = self.categories[category]["words"]
-        words = [w for w in all_words if search_text in w.lower()] if search_text else all_words
-        if not words:
-            ttk.Label(scrollable, text="未找到匹配词条", foreground="gray").pack(pady=10)
+        cat = self.categories[category]
+        search_text = cat["search"].get().strip().lower()
+        all_words = cat["words"]
+        if search_text:
+            words = cat["trie"].find(search_text)
+            if not words:
+                # 没有前缀匹配时退回到子串匹配
+                words = [w for w, lower in zip(all_words, cat["words_lower"]) if search_text in lower]
+        else:
+            words = all_words
+        self._render_words(category, words[:50], "未找到匹配词条")
+    
+    def _render_words(self, category, words, empty_text):
+        """重绘词条列表：清空文本后用一次insert调用写入全部词条
+        
+        词条标签 w0、w1... 作为槽位复用，只在"word"标签上绑定一个点击处理函数，
+        刷新时不再为每个词创建回调或重复绑定标签。
+        """
+        cat = self.categories[category]
+        render_key = (tuple(words), empty_text)
+        if render_key == cat["last_render"]:
             return
-        row_frame = None
-        for i, word in enumerate(words[:50]):
-            if i % 6 == 0:
-                row_frame = ttk.Frame(scrollable)
-                row_frame.pack(fill="x", pady=2)
-            btn = tk.Button(row_frame, text=word, width=min(12, max(6, len(word) + 2)),
-                command=lambda w=word: self.on_word_click(w), relief="raised", bd=1)
-            btn.pack(side="left", padx=2, pady=1)
+        cat["last_render"] = render_key
+        word_text = cat["text"]
+        slots = cat["tags"]
+        for i in range(len(slots), len(words)):
+            slots.append(f"w{i}")
+        cat["shown"] = list(words)
+        word_text.config(state="normal")
+        word_text.delete("1.0", "end")
+        if not words:
+            word_text.insert("1.0", f"\n{empty_text}", "hint")
+        else:
+            chunks = []
+            for i, word in enumerate(words):
+                # 每行6个词，与原按钮网格一致
+                sep = "\n" if i % 6 == 5 else "\t"
+                chunks.extend((f" {word} ", ("word", slots[i]), sep, ()))
+            word_text.insert("1.0", *chunks)
+        word_text.config(state="disabled")
+    
+    def _on_word_tag_click(self, category, event):
+        """从点击位置的槽位标签(w序号)取出对应词条"""
+        cat = self.categories[category]
+        for tag in cat["text"].tag_names(f"@{event.x},{event.y}"):
+            if tag[0] == "w" and tag[1:].isdigit():
+                index = int(tag[1:])
+                if index < len(cat["shown"]):
+                    self.on_word_click(cat["shown"][index])
+                return
     
     def on_word_click(self, word):
         if self.on_select_callback:
@@ -340,6 +775,15 @@ class SmartCompletionPanel:
     def get_frame(self):
         return self.main_frame
     
+    def close(self):
+        # 加载线程还在读取时先让它退出，再关闭它使用的连接
+        self._closing = True
+        if self._load_thread is not None:
+            self._load_thread.join()
+        if self._worker_conn is not None:
+            self._worker_conn.close()
+            self._worker_conn = None
+    
     def is_enabled(self):
         return self.enabled.get()
 
@@ -352,11 +796,51 @@ class PrescriptionSystem:
         self.settings = Settings()
         self.db_file = "prescriptions.db"
         self.template_file = "处方打印样本.docx"
+        # 小票模板文档的内存副本，首次打印时生成；key记录生成模板时的版式设置
+        self._template_bytes = None
+        self._template_key = None
+        # 预览刷新的防抖定时器
+        self._preview_after_id = None
+        # 历史查询的防抖定时器
+        self._search_after_id = None
+        # 打印预览中当前显示的小票文本（按行），用于增量更新
+        self._last_receipt_lines = []
+        self._last_receipt_text = None
+        # 上次生成的小票文本及其输入（表单快照、设置项、分钟时间）
+        self._receipt_key = None
+        self._receipt_cache = ""
+        # 历史查询在后台线程执行：专用连接、串行锁和查询代号（丢弃过期结果）
+        self._search_conn = None
+        self._search_lock = threading.Lock()
+        self._query_token = 0
+        self._search_query = None
+        # 已显示的记录数，以及最后一行的(create_time, id)，用于定位下一页
+        self._search_count = 0
+        self._search_after = None
+        self._search_has_more = False
+        self._stats_prefix = ""
+        # 查询条件 -> (查询语句, 第一页记录, 是否还有下一页, 统计信息)
+        self._search_cache = OrderedDict()
+        self._search_cache_key = None
+        self._search_page_rows = []
+        # 总记录数/本月记录数只在数据变化或跨月后重新统计：(月初日期, 数据版本)
+        self._data_version = 0
+        self._stats_key = None
+        self._pending_stats_key = None
+        # 小票文件的写盘在线程池中执行，不阻塞界面
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        # 打印任务单独一个线程，多张小票按顺序发送
+        self._print_pool = ThreadPoolExecutor(max_workers=1)
+        # 后台线程的结果放入队列，由Tk主线程定时取出执行；后台线程不调用after()，
+        # 主循环启动前调用会抛出RuntimeError，结果就丢失了
+        self._ui_queue = queue.Queue()
+        self.root.after(50, self._drain_ui_queue)
         
         # 创建处方保存文件夹
         self.ensure_prescription_folder()
         
         self.init_database()
+        self.init_styles()
         self.create_widgets()
         self.refresh_printers()
     
@@ -367,11 +851,73 @@ class PrescriptionSystem:
             print(f"已创建文件夹：{PRESCRIPTION_FOLDER}")
     
     def init_database(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        """打开长连接并初始化表结构，整个程序生命周期内复用"""
+        # 写操作以BEGIN IMMEDIATE开始事务，一开始就取得写锁，不与后台读连接争抢升级
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False, cached_statements=256,
+            isolation_level="IMMEDIATE")
+        # 查询结果既可按序号也可按列名取值
+        self.conn.row_factory = sqlite3.Row
+        # WAL + synchronous=NORMAL：每次写入不再逐条fsync
+        self.conn.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            "PRAGMA temp_store=MEMORY;"
+            "PRAGMA cache_size=-20000;"
+            "PRAGMA mmap_size=268435456;"
+        )
+        cursor = self.conn.cursor()
         cursor.execute("CREATE TABLE IF NOT EXISTS prescriptions (id INTEGER PRIMARY KEY AUTOINCREMENT, patient_name TEXT NOT NULL, gender TEXT, age TEXT, phone TEXT, diagnosis TEXT, prescription TEXT NOT NULL, usage TEXT, doctor TEXT, doctor_phone TEXT, create_time TEXT NOT NULL, print_time TEXT)")
-        conn.commit()
-        conn.close()
+        # 历史查询、导出都按开方时间排序
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prescriptions_create_time ON prescriptions(create_time)")
+        # LIKE默认不区分大小写，索引需使用NOCASE排序规则才能被前缀匹配利用
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_name ON prescriptions(patient_name COLLATE NOCASE)")
+        # 智能补全按用法分组计数
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prescriptions_usage ON prescriptions(usage)")
+        self.name_fts_available = self._init_fts(cursor, "prescriptions_name_fts", SQL_CREATE_NAME_FTS)
+        self.conn.commit()
+        # 统计信息只在首次建库时收集（ANALYZE会建立sqlite_stat1表），之后由关闭时的PRAGMA optimize按需更新
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'")
+        if cursor.fetchone() is None:
+            cursor.execute("ANALYZE")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def _init_fts(self, cursor, table, script):
+        """建立全文索引（FTS5外部内容表，由触发器与主表保持同步）
+        
+        SQLite未编译FTS5或不支持所需分词器时返回False，此时继续使用LIKE查询。
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        exists = cursor.fetchone() is not None
+        try:
+            cursor.executescript(script)
+        except sqlite3.OperationalError:
+            return False
+        if not exists:
+            # 首次创建时为已有记录建立索引
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+        return True
+    
+    def on_close(self):
+        """关闭主窗口时先断开数据库连接再销毁窗口"""
+        if hasattr(self, 'completion_panel'):
+            self.completion_panel.close()
+        # 使查询线程中尚未执行的回调全部失效；查询线程仍在运行时不等待它，连接随进程退出
+        self._query_token += 1
+        if self._search_lock.acquire(blocking=False):
+            if self._search_conn is not None:
+                self._search_conn.close()
+                self._search_conn = None
+            self._search_lock.release()
+        # 不等待正在写盘的小票：线程池线程会在进程退出前写完
+        self._io_pool.shutdown(wait=False)
+        self._print_pool.shutdown(wait=False)
+        # 只对数据变化较大、统计信息已过时的表重新ANALYZE，通常不做任何事
+        try:
+            self.conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        self.conn.close()
+        self.root.destroy()
     
     def create_widgets(self):
         notebook = ttk.Notebook(self.root)
@@ -381,10 +927,20 @@ class PrescriptionSystem:
         self.create_input_page(input_frame)
         query_frame = ttk.Frame(notebook)
         notebook.add(query_frame, text="历史查询")
-        self.create_query_page(query_frame)
         settings_frame = ttk.Frame(notebook)
         notebook.add(settings_frame, text="设置")
-        self.create_settings_page(settings_frame)
+        # 查询页和设置页在第一次切换到该标签时才创建控件
+        self._lazy_pages = {
+            str(query_frame): self.create_query_page,
+            str(settings_frame): self.create_settings_page,
+        }
+        notebook.bind("<<NotebookTabChanged>>", self._on_main_tab_changed)
+    
+    def _on_main_tab_changed(self, event):
+        tab = event.widget.select()
+        build_page = self._lazy_pages.pop(tab, None)
+        if build_page:
+            build_page(event.widget.nametowidget(tab))
     
     def create_settings_page(self, parent):
         # 创建主框架，使用grid布局确保全页显示
@@ -411,7 +967,15 @@ class PrescriptionSystem:
         # 鼠标滚轮绑定
         def _on_mousewheel(event):
             canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
+        # 只在鼠标位于设置页画布上时接管滚轮，离开后解除全局绑定
+        def _on_canvas_leave(event):
+            # 移入画布内嵌的main_frame时画布也会收到Leave，此时鼠标仍在设置页内，不解除绑定
+            x, y = canvas.winfo_pointerxy()
+            path = str(canvas.tk.call("winfo", "containing", x, y))
+            if path != str(canvas) and not path.startswith(str(canvas) + "."):
+                canvas.unbind_all("<MouseWheel>")
+        canvas.bind("<Enter>", lambda e: canvas.bind_all("<MouseWheel>", _on_mousewheel))
+        canvas.bind("<Leave>", _on_canvas_leave)
         
         # 设置main_frame的宽度，确保内容居中显示
         def configure_frame(event=None):
@@ -717,7 +1281,11 @@ class PrescriptionSystem:
         ttk.Label(left_frame, text="打印机：").grid(row=row, column=0, sticky="w", pady=5)
         self.printer_combo = ttk.Combobox(left_frame, width=40, state="readonly")
         self.printer_combo.grid(row=row, column=1, columnspan=2, sticky="w", pady=5)
-        ttk.Button(left_frame, text="刷新", command=self.refresh_printers, width=8).grid(row=row, column=3, sticky="w", pady=5, padx=(10, 0))
+        # 刷新：30秒内复用缓存的打印机列表；强制刷新：忽略缓存重新枚举
+        printer_btn_frame = ttk.Frame(left_frame)
+        printer_btn_frame.grid(row=row, column=3, sticky="w", pady=5, padx=(10, 0))
+        ttk.Button(printer_btn_frame, text="刷新", command=self.refresh_printers, width=8).pack(side="left")
+        ttk.Button(printer_btn_frame, text="强制刷新", command=lambda: self.refresh_printers(force=True), width=8).pack(side="left", padx=(5, 0))
         
         row += 1
         btn_frame = ttk.Frame(left_frame)
@@ -731,12 +1299,12 @@ class PrescriptionSystem:
         for entry in [self.name_entry, self.age_entry, self.phone_entry_patient, self.diagnosis_entry, self.usage_entry]:
             entry.bind('<Return>', lambda e: self.save_and_print())
         
-        ContextMenu(self.name_entry)
-        ContextMenu(self.age_entry)
-        ContextMenu(self.phone_entry_patient)
-        ContextMenu(self.diagnosis_entry)
-        ContextMenu(self.prescription_text)
-        ContextMenu(self.usage_entry)
+        ContextMenu.attach(self.name_entry)
+        ContextMenu.attach(self.age_entry)
+        ContextMenu.attach(self.phone_entry_patient)
+        ContextMenu.attach(self.diagnosis_entry)
+        ContextMenu.attach(self.prescription_text)
+        ContextMenu.attach(self.usage_entry)
         
         right_frame = ttk.Frame(main_container, padding="5")
         right_frame.pack(side="right", fill="both", padx=5, pady=5)
@@ -750,11 +1318,13 @@ class PrescriptionSystem:
         print_scroll.pack(side="right", fill="y")
         self.print_preview_text.pack(side="left", fill="both", expand=True)
         
-        for widget in [self.name_entry, self.age_entry, self.phone_entry_patient, self.diagnosis_entry, self.usage_entry]:
-            widget.bind('<KeyRelease>', self.update_preview)
-        self.prescription_text.bind('<KeyRelease>', self.update_preview)
+        # 所有影响小票内容的输入框共用一个绑定标签，按键松开时刷新预览
+        self.root.bind_class("PreviewRefresh", '<KeyRelease>', self.update_preview)
+        for widget in [self.name_entry, self.age_entry, self.phone_entry_patient, self.diagnosis_entry,
+                       self.usage_entry, self.prescription_text]:
+            widget.bindtags(("PreviewRefresh",) + widget.bindtags())
         
-        self.completion_panel = SmartCompletionPanel(main_container, self.db_file, self.settings, on_select_callback=self.insert_completion)
+        self.completion_panel = SmartCompletionPanel(main_container, self.conn, self.db_file, self.settings, on_select_callback=self.insert_completion)
         self.completion_panel.get_frame().pack(fill="x", padx=10, pady=(0, 10))
         
         self._current_focused_widget = None
@@ -797,8 +1367,8 @@ class PrescriptionSystem:
         ttk.Label(name_frame, text="患者姓名：", width=10).pack(side="left")
         self.search_entry = ttk.Entry(name_frame, width=30)
         self.search_entry.pack(side="left", padx=10)
-        self.search_entry.bind('<Return>', lambda e: self.search_prescriptions())
-        ContextMenu(self.search_entry)
+        self.search_entry.bind('<Return>', self.schedule_search)
+        ContextMenu.attach(self.search_entry)
         
         # 第二行：日期范围搜索
         date_frame = ttk.Frame(search_frame)
@@ -825,8 +1395,10 @@ class PrescriptionSystem:
         # 查询按钮
         btn_frame = ttk.Frame(search_frame)
         btn_frame.pack(fill="x", pady=10)
-        ttk.Button(btn_frame, text="查询", command=self.search_prescriptions, width=15).pack(side="left", padx=10)
+        ttk.Button(btn_frame, text="查询", command=self.schedule_search, width=15).pack(side="left", padx=10)
         ttk.Button(btn_frame, text="全部/刷新", command=self.load_all_prescriptions, width=15).pack(side="left", padx=10)
+        self.load_more_btn = ttk.Button(btn_frame, text="加载更多", command=self.load_more_prescriptions, width=15, state="disabled")
+        self.load_more_btn.pack(side="left", padx=10)
         
         # 统计信息框架
         stats_frame = ttk.LabelFrame(main_frame, text="统计信息", padding="10")
@@ -862,7 +1434,12 @@ class PrescriptionSystem:
         # 添加滚动条
         v_scroll = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
         h_scroll = ttk.Scrollbar(list_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        def on_tree_scroll(first, last):
+            v_scroll.set(first, last)
+            # 滚动到接近底部时自动加载下一页
+            if self._search_has_more and float(last) > 0.9:
+                self.load_more_prescriptions()
+        self.tree.configure(yscrollcommand=on_tree_scroll, xscrollcommand=h_scroll.set)
         
         # 布局
         self.tree.grid(row=0, column=0, sticky="nsew")
@@ -888,24 +1465,56 @@ class PrescriptionSystem:
         self.load_all_prescriptions()
     
     def update_preview(self, event=None):
+        # 防抖：连续输入时只在停止输入120ms后重绘一次预览
+        if self._preview_after_id:
+            self.root.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.root.after(120, self._do_update_preview)
+    
+    def _do_update_preview(self):
+        self._preview_after_id = None
         self.update_print_preview()
     
     def update_print_preview(self):
-        self.print_preview_text.config(state="normal")
-        self.print_preview_text.delete("1.0", tk.END)
-        preview = self.generate_receipt_text()
-        self.print_preview_text.insert("1.0", preview)
-        self.print_preview_text.config(state="disabled")
+        """按行比较新旧小票文本，只改写有变化的行，避免整段删除重排"""
+        receipt = self.generate_receipt_text()
+        if receipt is self._last_receipt_text:
+            # 小票文本命中缓存（例如只移动了光标），不触碰文本控件
+            return
+        self._last_receipt_text = receipt
+        new_lines = receipt.split('\n')
+        old_lines = self._last_receipt_lines
+        if new_lines == old_lines:
+            return
+        text = self.print_preview_text
+        text.config(state="normal")
+        common = min(len(old_lines), len(new_lines))
+        for i in range(common):
+            if old_lines[i] != new_lines[i]:
+                text.delete(f"{i + 1}.0", f"{i + 1}.end")
+                text.insert(f"{i + 1}.0", new_lines[i])
+        if not old_lines:
+            text.insert("1.0", '\n'.join(new_lines))
+        elif len(new_lines) > common:
+            text.insert("end-1c", '\n' + '\n'.join(new_lines[common:]))
+        elif len(old_lines) > common:
+            text.delete(f"{common}.end", "end-1c")
+        text.config(state="disabled")
+        self._last_receipt_lines = new_lines
+    
+    def refresh_printers(self, force=False):
+        """在线程池中枚举打印机，结果回到主线程后再填入下拉框"""
+        future = self._io_pool.submit(_list_printers, force)
+        future.add_done_callback(lambda f: self._post_to_ui(self._apply_printers, f))
     
-    def refresh_printers(self):
+    def _apply_printers(self, future):
         try:
-            printers = [p[2] for p in win32print.EnumPrinters(2)]
+            printers = future.result()
             self.printer_combo['values'] = printers
             if printers:
-                for p in printers:
-                    if any(keyword in p.lower() for keyword in ['pos', '58', 'receipt', 'thermal', '小票', '热敏']):
-                        self.printer_combo.set(p)
-                        return
+                pos_printer = next((p for p in printers if _is_pos_printer(p)), None)
+                if pos_printer:
+                    self.printer_combo.set(pos_printer)
+                    return
                 default_printer = win32print.GetDefaultPrinter()
                 if default_printer in printers:
                     self.printer_combo.set(default_printer)
@@ -915,60 +1524,106 @@ class PrescriptionSystem:
             messagebox.showwarning("提示", f"获取打印机列表失败：{e}")
             self.printer_combo.set("")
     
+    def _read_form(self):
+        """一次性读取表单各字段（已去除首尾空白），供校验、保存、生成小票共用"""
+        return FormData(
+            self.name_entry.get().strip(),
+            self.gender_var.get(),
+            self.age_entry.get().strip(),
+            self.phone_entry_patient.get().strip(),
+            self.diagnosis_entry.get().strip(),
+            self.prescription_text.get("1.0", "end-1c").strip(),
+            self.usage_entry.get().strip()
+        )
+    
     def save_only(self):
-        if not self.validate_input():
+        form = self._read_form()
+        if not self.validate_input(form):
             return
-        if self.save_to_database():
-            self.completion_panel.load_words_from_database()
+        if self.save_to_database(form):
+            self.learn_saved_prescription(form)
             messagebox.showinfo("成功", "处方已保存！")
             self.clear_form()
     
+    def learn_saved_prescription(self, form):
+        """把刚保存的处方增量加入智能补全词库"""
+        self.completion_panel.add_prescription(form.diagnosis, form.prescription, form.usage)
+    
     def save_and_print(self):
-        if not self.validate_input():
+        form = self._read_form()
+        if not self.validate_input(form):
             return
-        if self.save_to_database():
-            self.completion_panel.load_words_from_database()
-            docx_file = self.generate_receipt_docx()
-            if docx_file:
-                if messagebox.askyesno("保存成功", f"处方已保存：\n{docx_file}\n\n是否立即打印？"):
-                    self.print_docx(docx_file)
-                messagebox.showinfo("完成", "处方已保存并打印！")
-            else:
+        if self.save_to_database(form):
+            self.learn_saved_prescription(form)
+            # 表单内容已读取，小票写盘期间即可清空表单继续录入
+            docx_file = self.generate_receipt_docx(form, on_saved=self._ask_print_saved)
+            if not docx_file:
                 messagebox.showinfo("成功", "处方已保存！")
             self.clear_form()
     
-    def validate_input(self):
-        name = self.name_entry.get().strip()
-        prescription = self.prescription_text.get("1.0", "end-1c").strip()
-        if not name:
+    def _ask_print_saved(self, docx_file):
+        if messagebox.askyesno("保存成功", f"处方已保存：\n{docx_file}\n\n是否立即打印？"):
+            # 打印命令发出后再提示，不在打印前抢先弹出“完成”
+            self.print_docx(docx_file, on_done=lambda: messagebox.showinfo("完成", "处方已保存并发送到打印机！"))
+    
+    def validate_input(self, form=None):
+        if form is None:
+            form = self._read_form()
+        if not form.name:
             messagebox.showwarning("提示", "请输入患者姓名！")
             self.name_entry.focus_set()
             return False
-        if not prescription:
+        if not form.prescription:
             messagebox.showwarning("提示", "请输入处方内容！")
             self.prescription_text.focus_set()
             return False
         return True
     
-    def save_to_database(self):
+    def save_to_database(self, form=None):
+        if form is None:
+            form = self._read_form()
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 表单字段顺序与SQL_INSERT的前7列一致
+        params = (*form, self.settings.default_doctor, self.settings.default_phone, current_time)
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute("INSERT INTO prescriptions (patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (self.name_entry.get().strip(), self.gender_var.get(), self.age_entry.get().strip(),
-                 self.phone_entry_patient.get().strip(), self.diagnosis_entry.get().strip(),
-                 self.prescription_text.get("1.0", "end-1c").strip(), self.usage_entry.get().strip(),
-                 self.settings.default_doctor, self.settings.default_phone, current_time))
-            conn.commit()
-            conn.close()
+            # 事务上下文：成功自动提交，出错自动回滚
+            with self.conn:
+                self.conn.execute(SQL_INSERT, params)
+            self._invalidate_search_cache()
             return True
         except Exception as e:
             messagebox.showerror("错误", f"保存失败：{e}")
             return False
     
-    def generate_receipt_docx(self):
-        """生成小票 - 使用用户配置的压缩参数"""
+    def bulk_insert(self, rows):
+        """批量导入历史处方，全部行在同一个事务中写入
+        
+        rows 中每一项为 (patient_name, gender, age, phone, diagnosis, prescription,
+        usage, doctor, doctor_phone, create_time, print_time)，返回写入的行数
+        """
+        rows = list(rows)
+        columns = "patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time, print_time"
+        placeholder = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        # 多行VALUES：每条语句90行（990个参数），兼容旧版SQLite 999个参数的上限
+        chunk_size = 90
+        full_chunks = len(rows) // chunk_size * chunk_size
+        multi_sql = f"INSERT INTO prescriptions ({columns}) VALUES " + ", ".join([placeholder] * chunk_size)
+        with self.conn:
+            for start in range(0, full_chunks, chunk_size):
+                self.conn.execute(multi_sql, [field for row in rows[start:start + chunk_size] for field in row])
+            # 剩余不足一批的行用单行语句executemany
+            if full_chunks < len(rows):
+                self.conn.executemany(f"INSERT INTO prescriptions ({columns}) VALUES {placeholder}", rows[full_chunks:])
+        self._invalidate_search_cache()
+        return len(rows)
+    
+    def generate_receipt_docx(self, form=None, on_saved=None):
+        """生成小票 - 使用用户配置的压缩参数
+        
+        form 为 _read_form() 的结果，未传入时从表单读取。文档在主线程中生成，
+        写盘（docx和txt副本）交给线程池；写完后在主线程中调用 on_saved(文件绝对路径)。
+        返回小票文件路径，生成失败时返回None。
+        """
         if not DOCX_AVAILABLE:
             messagebox.showerror("错误", "未安装python-docx库！\n请运行: pip install python-docx")
             return None
@@ -983,307 +1638,312 @@ class PrescriptionSystem:
             # 确保文件夹存在
             self.ensure_prescription_folder()
             
-            doc = Document()
-            section = doc.sections[0]
+            # 表单内容只读取一次，页面高度计算、正文和txt副本共用；日期行和文件名使用同一时刻
+            if form is None:
+                form = self._read_form()
+            now = datetime.now()
+            patient_name = form.name
+            diagnosis = form.diagnosis
+            usage = form.usage
+            prescription_lines = self._split_prescription_lines(form.prescription)
             
-            # 设置页面宽度为58mm
-            section.page_width = Cm(5.8)
+            # 页面宽度、边距和默认样式已在模板中设置好，这里只需设置页面高度
+            doc = self._new_document()
+            section = doc.sections[0]
             
             # 计算页面高度
-            page_height = self.calculate_page_height()
+            page_height = self.calculate_page_height(prescription_lines, diagnosis, usage)
             section.page_height = Cm(page_height)
             print(f"  计算页面高度: {page_height:.2f}cm")
             
-            # 设置边距
-            margin = self.settings.margin_size
-            section.left_margin = Cm(margin)
-            section.right_margin = Cm(margin)
-            section.top_margin = Cm(margin)
-            section.bottom_margin = Cm(margin)
-            
-            # 设置默认字体和段落格式
-            style = doc.styles['Normal']
-            style.font.name = '宋体'
-            style.font.size = Pt(self.settings.font_size)
-            style._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-            style.paragraph_format.line_spacing = self.settings.line_spacing
-            style.paragraph_format.space_before = Pt(0)
-            style.paragraph_format.space_after = Pt(0)
-            
             font_size = self.settings.font_size
             line_spacing = self.settings.line_spacing
+            # 字号对象只创建一次，各段落共用
+            size = Pt(font_size)
+            size_mid = Pt(font_size + 1)
+            size_big = Pt(font_size + 2)
+            zero = Pt(0)
             
             # 标题 - 使用设置的诊所名称
             title = doc.add_paragraph()
             title.alignment = WD_ALIGN_PARAGRAPH.CENTER
             title.paragraph_format.line_spacing = line_spacing
-            title.paragraph_format.space_before = Pt(0)
-            title.paragraph_format.space_after = Pt(0)
+            title.paragraph_format.space_before = zero
+            title.paragraph_format.space_after = zero
             
             # 如果设置了诊所名称，使用诊所名称，否则使用默认值
             clinic_name = self.settings.clinic_name if self.settings.clinic_name else "海口市龙华区诊所名字"
             run = title.add_run(clinic_name)
-            run.font.size = Pt(font_size + 2)
+            run.font.size = size_big
             run.font.bold = True
             run.font.name = '黑体'
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), '黑体')
+            run._element.rPr.rFonts.set(EASTASIA, '黑体')
             
             # 如果设置了诊所地址，添加地址信息
             if self.settings.clinic_address:
                 address = doc.add_paragraph()
                 address.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 address.paragraph_format.line_spacing = line_spacing
-                address.paragraph_format.space_before = Pt(0)
-                address.paragraph_format.space_after = Pt(0)
+                address.paragraph_format.space_before = zero
+                address.paragraph_format.space_after = zero
                 address_run = address.add_run(self.settings.clinic_address)
-                address_run.font.size = Pt(font_size)
+                address_run.font.size = size
                 address_run.font.name = '宋体'
-                address_run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+                address_run._element.rPr.rFonts.set(EASTASIA, '宋体')
             
             # 如果设置了诊所电话，添加电话信息
             if self.settings.clinic_phone:
                 phone = doc.add_paragraph()
                 phone.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 phone.paragraph_format.line_spacing = line_spacing
-                phone.paragraph_format.space_before = Pt(0)
-                phone.paragraph_format.space_after = Pt(0)
+                phone.paragraph_format.space_before = zero
+                phone.paragraph_format.space_after = zero
                 phone_run = phone.add_run(f"电话：{self.settings.clinic_phone}")
-                phone_run.font.size = Pt(font_size)
+                phone_run.font.size = size
                 phone_run.font.name = '宋体'
-                phone_run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+                phone_run._element.rPr.rFonts.set(EASTASIA, '宋体')
             
             # 副标题
             subtitle = doc.add_paragraph()
             subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
             subtitle.paragraph_format.line_spacing = line_spacing
-            subtitle.paragraph_format.space_before = Pt(0)
-            subtitle.paragraph_format.space_after = Pt(0)
+            subtitle.paragraph_format.space_before = zero
+            subtitle.paragraph_format.space_after = zero
             run = subtitle.add_run("中医干预中药处方")
-            run.font.size = Pt(font_size + 1)
+            run.font.size = size_mid
             run.font.bold = True
             run.font.name = '黑体'
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), '黑体')
+            run._element.rPr.rFonts.set(EASTASIA, '黑体')
             
             # 分隔线
             para = doc.add_paragraph()
             para.alignment = WD_ALIGN_PARAGRAPH.CENTER
             para.paragraph_format.line_spacing = line_spacing
-            para.paragraph_format.space_before = Pt(0)
-            para.paragraph_format.space_after = Pt(0)
-            run = para.add_run("─" * 16)
-
-            run.font.size = Pt(font_size)
+            para.paragraph_format.space_before = zero
+            para.paragraph_format.space_after = zero
+            run = para.add_run(DOCX_SEP_LINE)
+            run.font.size = size
             
             # 患者信息
-            self._add_compact_line(doc, f"姓名：{self.name_entry.get().strip()}", font_size, line_spacing)
-            self._add_compact_line(doc, f"性别：{self.gender_var.get()}  年龄：{self.age_entry.get().strip()}", font_size, line_spacing)
-            self._add_compact_line(doc, f"电话：{self.phone_entry_patient.get().strip()}", font_size, line_spacing)
-            self._add_compact_line(doc, f"日期：{datetime.now().strftime('%Y-%m-%d %H:%M')}", font_size, line_spacing)
+            self._add_compact_line(doc, f"姓名：{patient_name}", size)
+            self._add_compact_line(doc, f"性别：{form.gender}  年龄：{form.age}", size)
+            self._add_compact_line(doc, f"电话：{form.phone}", size)
+            self._add_compact_line(doc, f"日期：{_now_minute_str()}", size)
             
             # 分隔线
             para = doc.add_paragraph()
             para.alignment = WD_ALIGN_PARAGRAPH.CENTER
             para.paragraph_format.line_spacing = line_spacing
-            para.paragraph_format.space_before = Pt(0)
-            para.paragraph_format.space_after = Pt(0)
-            run = para.add_run("─" * 16)
-            run.font.size = Pt(font_size)
+            para.paragraph_format.space_before = zero
+            para.paragraph_format.space_after = zero
+            run = para.add_run(DOCX_SEP_LINE)
+            run.font.size = size
             
             # 中医辨证
-            diagnosis = self.diagnosis_entry.get().strip()
             if diagnosis:
                 para = doc.add_paragraph()
                 para.paragraph_format.line_spacing = line_spacing
-                para.paragraph_format.space_before = Pt(0)
-                para.paragraph_format.space_after = Pt(0)
+                para.paragraph_format.space_before = zero
+                para.paragraph_format.space_after = zero
                 run = para.add_run("中医辨证：")
                 run.font.bold = True
-                run.font.size = Pt(font_size)
+                run.font.size = size
                 run = para.add_run(diagnosis)
-                run.font.size = Pt(font_size)
+                run.font.size = size
             
             # 处方
             para = doc.add_paragraph()
             para.paragraph_format.line_spacing = line_spacing
-            para.paragraph_format.space_before = Pt(0)
-            para.paragraph_format.space_after = Pt(0)
+            para.paragraph_format.space_before = zero
+            para.paragraph_format.space_after = zero
             run = para.add_run("处方：")
             run.font.bold = True
-            run.font.size = Pt(font_size)
+            run.font.size = size
             
-            prescription_content = self.prescription_text.get("1.0", "end-1c").strip()
-            if prescription_content:
-                prescription_lines = prescription_content.split('\n')
-                # 限制处方最大行数，确保单页
-                max_prescription_lines = 15  # 限制处方最多15行
-                line_count = 0
-                for line in prescription_lines:
-                    if line.strip():
-                        line_count += 1
-                        if line_count > max_prescription_lines:
-                            # 添加省略号表示内容被截断
-                            self._add_compact_line(doc, "  ...（内容过多，已截断）", font_size, line_spacing)
-                            break
-                        self._add_compact_line(doc, f"  {line.strip()}", font_size, line_spacing)
+            # 限制处方最大行数，确保单页
+            for line in prescription_lines[:MAX_PRESCRIPTION_LINES]:
+                self._add_compact_line(doc, f"  {line}", size)
+            if len(prescription_lines) > MAX_PRESCRIPTION_LINES:
+                # 添加省略号表示内容被截断
+                self._add_compact_line(doc, "  ...（内容过多，已截断）", size)
             
             # 用法
-            usage = self.usage_entry.get().strip()
             if usage:
                 para = doc.add_paragraph()
                 para.paragraph_format.line_spacing = line_spacing
-                para.paragraph_format.space_before = Pt(0)
-                para.paragraph_format.space_after = Pt(0)
+                para.paragraph_format.space_before = zero
+                para.paragraph_format.space_after = zero
                 run = para.add_run("用法：")
                 run.font.bold = True
-                run.font.size = Pt(font_size)
+                run.font.size = size
                 run = para.add_run(usage)
-                run.font.size = Pt(font_size)
+                run.font.size = size
             
             # 分隔线
             para = doc.add_paragraph()
             para.alignment = WD_ALIGN_PARAGRAPH.CENTER
             para.paragraph_format.line_spacing = line_spacing
-            para.paragraph_format.space_before = Pt(0)
-            para.paragraph_format.space_after = Pt(0)
-            run = para.add_run("=" * 34)
-            run.font.size = Pt(font_size)
+            para.paragraph_format.space_before = zero
+            para.paragraph_format.space_after = zero
+            run = para.add_run(DOCX_SEP_DOUBLE)
+            run.font.size = size
             
             # 医生信息
             doctor = self.settings.default_doctor
             if doctor:
-                self._add_compact_line(doc, f"开方医生：{doctor}", font_size, line_spacing)
+                self._add_compact_line(doc, f"开方医生：{doctor}", size)
             phone = self.settings.default_phone
             if phone:
-                self._add_compact_line(doc, f"联系电话：{phone}", font_size, line_spacing)
+                self._add_compact_line(doc, f"联系电话：{phone}", size)
             
             # 添加执业许可证号
             license_num = self.settings.clinic_license
             if license_num:
-                self._add_compact_line(doc, f"执业许可证号：{license_num}", font_size, line_spacing)
+                self._add_compact_line(doc, f"执业许可证号：{license_num}", size)
             
             # 最后分隔线
             para = doc.add_paragraph()
             para.alignment = WD_ALIGN_PARAGRAPH.CENTER
             para.paragraph_format.line_spacing = line_spacing
-            para.paragraph_format.space_before = Pt(0)
-            para.paragraph_format.space_after = Pt(0)
-            run = para.add_run("=" * 34)
-            run.font.size = Pt(font_size)
+            para.paragraph_format.space_before = zero
+            para.paragraph_format.space_after = zero
+            run = para.add_run(DOCX_SEP_DOUBLE)
+            run.font.size = size
             
             # 生成文件名并保存
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            patient_name = self.name_entry.get().strip()
-            filename = os.path.join(PRESCRIPTION_FOLDER, f"处方_{patient_name}_{timestamp}.docx")
-            doc.save(filename)
-            
-            print(f"  ✓ 小票生成成功！")
-            
-            # 保存txt文件
-            try:
-                txt_file = filename.replace('.docx', '.txt')
-                with open(txt_file, "w", encoding="utf-8") as f:
-                    f.write(self.generate_receipt_text())
-            except:
-                pass
-            
-            return os.path.abspath(filename)
+            timestamp = now.strftime('%Y%m%d_%H%M%S')
+            filename = os.path.abspath(os.path.join(PRESCRIPTION_FOLDER, f"处方_{patient_name}_{timestamp}.docx"))
+            receipt_text = self.generate_receipt_text(form)
+            future = self._io_pool.submit(self._save_receipt_files, doc, filename, receipt_text)
+            future.add_done_callback(lambda f: self._post_to_ui(self._on_receipt_saved, f, on_saved))
+            return filename
             
         except Exception as e:
             print(f"  生成失败: {e}")
             messagebox.showerror("错误", f"生成小票失败：{e}")
             return None
     
-    def _add_compact_line(self, doc, text, font_size, line_spacing):
-        """添加紧凑行"""
-        para = doc.add_paragraph()
-        para.paragraph_format.line_spacing = line_spacing
-        para.paragraph_format.space_before = Pt(0)
-        para.paragraph_format.space_after = Pt(0)
-        run = para.add_run(text)
-        run.font.size = Pt(font_size)
-    
-    def calculate_page_height(self):
-        """计算页面高度 - 强制单页"""
-        # 基础行高
-        base_line_height = (self.settings.font_size / 72) * 2.54 * self.settings.line_spacing
-        
-        # 计算内容总高度
-        content_height = 0
-        
-        # 标题区域
-        content_height += base_line_height * 1.2  # 医院名称
-        
-        # 新增：诊所地址（如果有）
-        if self.settings.clinic_address:
-            address_lines = max(1, len(self.settings.clinic_address) // 18 + 1)
-            content_height += base_line_height * address_lines
+    def _save_receipt_files(self, doc, filename, receipt_text):
+        """线程池中执行：保存docx及同名txt副本，不访问任何Tk控件"""
+        doc.save(filename)
+        # 保存txt文件
+        try:
+            with open(filename.replace('.docx', '.txt'), "w", encoding="utf-8") as f:
+                f.write(receipt_text)
+        except OSError:
+            pass
+        return filename
+    
+    def _on_receipt_saved(self, future, on_saved):
+        try:
+            filename = future.result()
+        except Exception as e:
+            print(f"  生成失败: {e}")
+            messagebox.showerror("错误", f"生成小票失败：{e}")
+            return
+        print(f"  ✓ 小票生成成功！")
+        if on_saved:
+            on_saved(filename)
+    
+    def _new_document(self):
+        """从内存中的小票模板创建文档
+        
+        模板预先设置好58mm页宽、边距和Normal样式，保存为字节后缓存；
+        字号、行距或边距设置变化时重新生成。
+        """
+        settings = self.settings
+        key = (settings.font_size, settings.line_spacing, settings.margin_size)
+        if self._template_bytes is None or self._template_key != key:
+            doc = Document()
+            section = doc.sections[0]
+            
+            # 设置页面宽度为58mm
+            section.page_width = Cm(5.8)
             
-        # 新增：诊所电话（如果有）
-        if self.settings.clinic_phone:
-            content_height += base_line_height
+            # 设置边距
+            margin = settings.margin_size
+            section.left_margin = Cm(margin)
+            section.right_margin = Cm(margin)
+            section.top_margin = Cm(margin)
+            section.bottom_margin = Cm(margin)
             
-        content_height += base_line_height * 1.0  # 处方标题
-        content_height += base_line_height * 0.6  # 分隔线
-        
-        # 患者信息（4行）
-        content_height += base_line_height * 4
-        
-        # 分隔线
-        content_height += base_line_height * 0.6
-        
-        # 中医辨证
-        diagnosis = self.diagnosis_entry.get().strip()
-        if diagnosis:
-            diag_lines = max(1, len(diagnosis) // 18 + 1)
-            content_height += base_line_height * diag_lines
-        
-        # 处方标签
-        content_height += base_line_height
-        
-        # 处方内容 - 限制最大行数
-        prescription_content = self.prescription_text.get("1.0", "end-1c").strip()
-        if prescription_content:
-            prescription_lines = prescription_content.split('\n')
-            # 限制处方最大行数，确保单页
-            max_prescription_lines = 15  # 限制处方最多15行
-            line_count = 0
-            for line in prescription_lines:
-                if line.strip():
-                    line_count += 1
-                    if line_count > max_prescription_lines:
-                        break
-                    line_lines = max(1, len(line.strip()) // 16 + 1)
-                    content_height += base_line_height * line_lines
-        
-        # 用法
-        usage = self.usage_entry.get().strip()
-        if usage:
-            usage_lines = max(1, len(usage) // 18 + 1)
-            content_height += base_line_height * usage_lines
-        
-        # 分隔线
-        content_height += base_line_height * 0.6
-        
-        # 医生信息
-        if self.settings.default_doctor:
-            content_height += base_line_height
-        if self.settings.default_phone:
-            content_height += base_line_height
+            # 设置默认字体和段落格式
+            style = doc.styles['Normal']
+            style.font.name = '宋体'
+            style.font.size = Pt(settings.font_size)
+            style._element.rPr.rFonts.set(EASTASIA, '宋体')
+            style.paragraph_format.line_spacing = settings.line_spacing
+            style.paragraph_format.space_before = Pt(0)
+            style.paragraph_format.space_after = Pt(0)
             
-        # 新增：执业许可证号（如果有）
-        if self.settings.clinic_license:
-            content_height += base_line_height
+            buffer = io.BytesIO()
+            doc.save(buffer)
+            self._template_bytes = buffer.getvalue()
+            self._template_key = key
+        return Document(io.BytesIO(self._template_bytes))
+    
+    def _add_compact_line(self, doc, text, size):
+        """添加紧凑行（行距和段前段后间距继承Normal样式）"""
+        run = doc.add_paragraph().add_run(text)
+        run.font.size = size
+    
+    def _split_prescription_lines(self, content):
+        """处方内容按行拆分，去掉首尾空白和空行
+        
+        最多返回 MAX_PRESCRIPTION_LINES + 1 行：超出上限的内容不会显示，
+        多出的一行只用来判断是否需要截断提示，其余行不再逐行处理。
+        """
+        lines = (line for line in map(str.strip, content.split('\n')) if line)
+        return list(islice(lines, MAX_PRESCRIPTION_LINES + 1))
+    
+    def calculate_page_height(self, prescription_lines=None, diagnosis=None, usage=None):
+        """计算页面高度 - 强制单页
+        
+        未传入表单内容时从输入框读取；生成小票时传入已读取的内容，避免重复读取和拆分。
+        """
+        settings = self.settings
+        if prescription_lines is None:
+            prescription_lines = self._split_prescription_lines(self.prescription_text.get("1.0", "end-1c"))
+        if diagnosis is None:
+            diagnosis = self.diagnosis_entry.get().strip()
+        if usage is None:
+            usage = self.usage_entry.get().strip()
         
-        # 最后分隔线
-        content_height += base_line_height * 0.6
+        # 基础行高
+        base_line_height = (settings.font_size / 72) * 2.54 * settings.line_spacing
+        
+        # 各部分占用的行数（以基础行高为单位），一次求和得到内容总高度
+        content_height = base_line_height * sum([
+            1.2,  # 医院名称
+            # 诊所地址、电话（如果有）
+            _wrap_count(settings.clinic_address),
+            1 if settings.clinic_phone else 0,
+            1.0,  # 处方标题
+            0.6,  # 分隔线
+            4,  # 患者信息（4行）
+            0.6,  # 分隔线
+            # 中医辨证
+            _wrap_count(diagnosis),
+            1,  # 处方标签
+            # 处方内容 - 限制最大行数
+            sum(_wrap_count(line, 16) for line in prescription_lines[:MAX_PRESCRIPTION_LINES]),
+            # 用法
+            _wrap_count(usage),
+            0.6,  # 分隔线
+            # 医生信息、执业许可证号（如果有）
+            1 if settings.default_doctor else 0,
+            1 if settings.default_phone else 0,
+            1 if settings.clinic_license else 0,
+            0.6,  # 最后分隔线
+        ])
         
         # 计算总高度，使用留空比例控制
         # 留空比例 = 总高度 / 内容高度，例如4/1表示总高度是内容高度的4倍
-        empty_ratio = self.settings.empty_ratio
+        empty_ratio = settings.empty_ratio
         total_height = content_height * empty_ratio
         
         # 添加边距
-        total_height += self.settings.margin_size * 2  # 上下边距
+        total_height += settings.margin_size * 2  # 上下边距
         
         # 严格限制最大高度为29.7cm（A4纸高度），确保单页
         max_height = 29.7
@@ -1292,117 +1952,112 @@ class PrescriptionSystem:
             
         return total_height
     
-    def generate_receipt_text(self):
-        lines = []
-        lines.append("=" * 22)
+    def generate_receipt_text(self, form=None):
+        # 表单内容和设置项只读取一次
+        if form is None:
+            form = self._read_form()
+        settings = self.settings
+        now_str = _now_minute_str()
+        # 表单、设置项和时间（精确到分钟）都没变时直接返回上次的结果
+        key = (form, now_str, settings.clinic_name, settings.default_doctor,
+               settings.default_phone, settings.clinic_license)
+        if key == self._receipt_key:
+            return self._receipt_cache
+        name = form.name
+        gender = form.gender
+        age = form.age
+        phone = form.phone
+        diagnosis = form.diagnosis
+        prescription_lines = self._split_prescription_lines(form.prescription)
+        usage = form.usage
+        
+        # 逐行写入缓冲区，每行以换行结尾，最后一行分隔线不带换行
+        buf = io.StringIO()
+        w = buf.write
+        w(TEXT_SEP_DOUBLE + "\n")
         
         # 使用设置中的诊所名称，如果未设置则使用默认值
-        clinic_name = self.settings.clinic_name if self.settings.clinic_name else "海口市龙华区诊所名字"
-        lines.append(f" {clinic_name}")
-        
-        lines.append("   中医干预中药处方")
-        lines.append("=" * 22)
-        lines.append(f"姓名：{self.name_entry.get().strip()}")
-        lines.append(f"性别：{self.gender_var.get()}  年龄：{self.age_entry.get().strip()}")
-        lines.append(f"电话：{self.phone_entry_patient.get().strip()}")
-        lines.append(f"日期：{datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        lines.append("-" * 22)
-        diagnosis = self.diagnosis_entry.get().strip()
+        clinic_name = settings.clinic_name if settings.clinic_name else "海口市龙华区诊所名字"
+        w(f" {clinic_name}\n")
+        
+        w("   中医干预中药处方\n")
+        w(TEXT_SEP_DOUBLE + "\n")
+        w(f"姓名：{name}\n")
+        w(f"性别：{gender}  年龄：{age}\n")
+        w(f"电话：{phone}\n")
+        w(f"日期：{now_str}\n")
+        w(TEXT_SEP_LINE + "\n")
         if diagnosis:
-            lines.append(f"中医辨证：{diagnosis}")
-        lines.append("")
-        lines.append("处方：")
-        prescription_content = self.prescription_text.get("1.0", "end-1c").strip()
-        if prescription_content:
-            prescription_lines = prescription_content.split('\n')
-            # 限制处方最大行数，确保单页
-            max_prescription_lines = 15  # 限制处方最多15行
-            line_count = 0
-            for line in prescription_lines:
-                if line.strip():
-                    line_count += 1
-                    if line_count > max_prescription_lines:
-                        lines.append("  ...（内容过多，已截断）")
-                        break
-                    lines.append(f"  {line.strip()}")
-        lines.append("")
-        usage = self.usage_entry.get().strip()
+            w(f"中医辨证：{diagnosis}\n")
+        w("\n处方：\n")
+        # 限制处方最大行数，确保单页
+        for line in prescription_lines[:MAX_PRESCRIPTION_LINES]:
+            w(f"  {line}\n")
+        if len(prescription_lines) > MAX_PRESCRIPTION_LINES:
+            w("  ...（内容过多，已截断）\n")
+        w("\n")
         if usage:
-            lines.append(f"用法：{usage}")
-        lines.append("-" * 22)
-        doctor = self.settings.default_doctor
+            w(f"用法：{usage}\n")
+        w(TEXT_SEP_LINE + "\n")
+        doctor = settings.default_doctor
         if doctor:
-            lines.append(f"开方医生：{doctor}")
-        phone = self.settings.default_phone
-        if phone:
-            lines.append(f"联系电话：{phone}")
+            w(f"开方医生：{doctor}\n")
+        doctor_phone = settings.default_phone
+        if doctor_phone:
+            w(f"联系电话：{doctor_phone}\n")
         
         # 添加执业许可证号
-        license_num = self.settings.clinic_license
+        license_num = settings.clinic_license
         if license_num:
-            lines.append(f"执业许可证号：{license_num}")
-        lines.append("=" * 22)
-        return '\n'.join(lines)
+            w(f"执业许可证号：{license_num}\n")
+        w(TEXT_SEP_DOUBLE)
+        self._receipt_key = key
+        self._receipt_cache = buf.getvalue()
+        return self._receipt_cache
     
-    def print_docx(self, docx_file):
+    def print_docx(self, docx_file, on_done=None):
+        """把打印任务交给打印线程，界面不必等待打印命令返回
+        
+        打印命令发出后在主线程中调用 on_done()；失败时提示错误并直接打开文件。
+        """
         printer_name = self.printer_combo.get()
+        future = self._print_pool.submit(self._print_docx_worker, docx_file, printer_name)
+        future.add_done_callback(lambda f: self._post_to_ui(self._on_print_done, f, docx_file, on_done))
+    
+    def _print_docx_worker(self, docx_file, printer_name):
+        """打印线程中执行，不访问任何Tk控件；所有方法都失败时抛出异常"""
+        if not printer_name or not WIN32_AVAILABLE:
+            # 如果没有指定打印机，使用默认方式
+            os.startfile(docx_file, "print")
+            return
+        
+        # 方法1：printto直接发送到指定打印机，不修改系统默认打印机，也不启动额外进程
         try:
-            if printer_name:
-                # 尝试多种打印方法
-                success = False
-                
-                # 方法1：使用os.startfile直接打印到指定打印机
-                try:
-                    # 使用win32print设置默认打印机，然后使用os.startfile
-                    import win32print
-                    import win32api
-                    
-                    # 保存当前默认打印机
-                    current_printer = win32print.GetDefaultPrinter()
-                    
-                    # 临时设置默认打印机
-                    try:
-                        win32print.SetDefaultPrinter(printer_name)
-                        # 打印文件
-                        os.startfile(docx_file, "print")
-                        success = True
-                    finally:
-                        # 恢复原来的默认打印机
-                        if current_printer:
-                            win32print.SetDefaultPrinter(current_printer)
-                except Exception as e1:
-                    print(f"默认打印机切换方法失败: {e1}")
-                
-                # 方法2：如果方法1失败，尝试使用PowerShell简单打印
-                if not success:
-                    try:
-                        import subprocess
-                        # 使用简单的PowerShell命令
-                        cmd = f'& Start-Process -FilePath "{docx_file}" -Verb Print'
-                        subprocess.run(['powershell', '-Command', cmd], 
-                                     check=True, timeout=30, 
-                                     creationflags=subprocess.CREATE_NO_WINDOW)
-                        success = True
-                    except Exception as e2:
-                        print(f"PowerShell简单打印失败: {e2}")
-                
-                # 方法3：如果以上都失败，尝试直接使用win32api
-                if not success:
-                    try:
-                        import win32api
-                        # 使用print命令
-                        win32api.ShellExecute(0, "print", docx_file, "", ".", 0)
-                        success = True
-                    except Exception as e3:
-                        print(f"win32api打印失败: {e3}")
-                
-                # 如果所有方法都失败，显示错误并提供备选方案
-                if not success:
-                    raise Exception("所有打印方法都失败，请检查打印机连接和驱动程序")
-            else:
-                # 如果没有指定打印机，使用默认方式
+            win32api.ShellExecute(0, "printto", docx_file, f'"{printer_name}"', ".", 0)
+            return
+        except Exception as e1:
+            print(f"printto打印失败: {e1}")
+        
+        # 方法2：文件关联不支持printto时，临时切换默认打印机后打印
+        try:
+            # 保存当前默认打印机
+            current_printer = win32print.GetDefaultPrinter()
+            try:
+                win32print.SetDefaultPrinter(printer_name)
                 os.startfile(docx_file, "print")
-                
+                return
+            finally:
+                # 恢复原来的默认打印机
+                if current_printer:
+                    win32print.SetDefaultPrinter(current_printer)
+        except Exception as e2:
+            print(f"默认打印机切换方法失败: {e2}")
+        
+        raise Exception("所有打印方法都失败，请检查打印机连接和驱动程序")
+    
+    def _on_print_done(self, future, docx_file, on_done):
+        try:
+            future.result()
         except Exception as e:
             messagebox.showerror("打印错误", f"打印失败：{e}\n\n可能的解决方案：\n1. 检查打印机是否已连接并开机\n2. 检查打印机驱动程序是否正常\n3. 检查打印机是否在线\n4. 尝试以管理员身份运行程序")
             try:
@@ -1410,6 +2065,9 @@ class PrescriptionSystem:
                 os.startfile(docx_file)
             except:
                 pass
+            return
+        if on_done:
+            on_done()
     
     def clear_form(self):
         self.name_entry.delete(0, tk.END)
@@ -1435,30 +2093,16 @@ class PrescriptionSystem:
             start_date = now.replace(day=1).strftime("%Y-%m-%d")
             end_date = now.strftime("%Y-%m-%d")
         elif range_type == "last_month":
-            # 上月第一天到上月最后一天
-            if now.month == 1:
-                last_month = now.replace(year=now.year-1, month=12, day=1)
-            else:
-                last_month = now.replace(month=now.month-1, day=1)
-            
-            # 计算上月最后一天
-            if last_month.month == 12:
-                next_month = last_month.replace(year=last_month.year+1, month=1)
-            else:
-                next_month = last_month.replace(month=last_month.month+1)
-            
-            last_day_of_last_month = (next_month - timedelta(days=1)).day
-            end_of_last_month = last_month.replace(day=last_day_of_last_month)
-            
-            start_date = last_month.strftime("%Y-%m-%d")
+            # 上月第一天到上月最后一天：本月1日的前一天即上月最后一天
+            end_of_last_month = now.replace(day=1) - timedelta(days=1)
+            start_date = end_of_last_month.replace(day=1).strftime("%Y-%m-%d")
             end_date = end_of_last_month.strftime("%Y-%m-%d")
         elif range_type == "recent_3_months":
-            # 近三个月
-            if now.month > 3:
-                three_months_ago = now.replace(month=now.month-3)
-            else:
-                three_months_ago = now.replace(year=now.year-1, month=now.month+9)
-            start_date = three_months_ago.strftime("%Y-%m-%d")
+            # 近三个月：按月份序号回退3个月，日期超过该月天数时取该月最后一天
+            year, month = divmod(now.year * 12 + now.month - 1 - 3, 12)
+            month += 1
+            day = min(now.day, calendar.monthrange(year, month)[1])
+            start_date = f"{year:04d}-{month:02d}-{day:02d}"
             end_date = now.strftime("%Y-%m-%d")
         else:
             return
@@ -1470,87 +2114,216 @@ class PrescriptionSystem:
         self.end_date_entry.insert(0, end_date)
         
         # 自动执行查询
+        self.schedule_search()
+
+    def schedule_search(self, event=None):
+        # 防抖：连续点击/回车时只在停止操作250ms后查询并重建一次列表
+        if self._search_after_id:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(250, self._do_search)
+    
+    def _do_search(self):
+        self._search_after_id = None
         self.search_prescriptions()
 
     def search_prescriptions(self):
         search_name = self.search_entry.get().strip()
         start_date = self.start_date_entry.get().strip()
         end_date = self.end_date_entry.get().strip()
-        now = datetime.now()
         
+        # 查询条件：create_time为"YYYY-MM-DD HH:MM:SS"文本，直接按范围比较，
+        # 不对列套用DATE()，才能走create_time索引
+        params = (start_date,) if start_date else ()
+        
+        if end_date:
+            # 包含结束日期当天：小于结束日期的下一天
+            try:
+                next_day = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+            except ValueError:
+                messagebox.showwarning("提示", "结束日期格式应为 YYYY-MM-DD！")
+                return
+            params += (next_day.strftime("%Y-%m-%d"),)
+        
+        if search_name and self.name_fts_available and len(search_name) >= NAME_FTS_MIN_LEN:
+            # 姓名包含匹配交给trigram索引，按短语查询即子串匹配
+            phrase = '"' + search_name.replace('"', '""') + '"'
+            query = (SQL_SEARCH_QUERIES_NAME_FTS[(bool(start_date), bool(end_date))], params + (phrase,))
+        elif search_name:
+            # 姓名按包含匹配（可按名字查到"李明"这类不以搜索词开头的姓名）
+            query = (SQL_SEARCH_QUERIES[(bool(start_date), bool(end_date), True)], params + (f'%{search_name}%',))
+        else:
+            query = (SQL_SEARCH_QUERIES[(bool(start_date), bool(end_date), False)], params)
+        
+        # 清空表格，结果由后台线程分批送回
+        self.tree.delete(*self.tree.get_children())
+        self.load_more_btn.config(state="disabled")
+        self._search_query = None
+        self._search_count = 0
+        self._search_after = None
+        self._search_has_more = False
+        month_start = _month_start_str()
+        cache_key = (search_name, start_date, end_date, month_start)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            # 相同条件的查询结果仍然有效，直接重新填充表格
+            self._search_cache.move_to_end(cache_key)
+            self._query_token += 1
+            self._search_cache_key = None
+            query, rows, has_more, stats = cached
+            self._begin_search_page(self._query_token, query, stats)
+            self._append_search_rows(self._query_token, rows)
+            self._finish_search_page(self._query_token, has_more)
+            return
+        self._search_cache_key = cache_key
+        self._search_page_rows = []
+        stats_key = (month_start, self._data_version)
+        if stats_key == self._stats_key:
+            # 统计数字仍然有效，只执行列表查询
+            self._start_search(query)
+        else:
+            self._pending_stats_key = stats_key
+            self._start_search(query, month_start)
+    
+    def _invalidate_search_cache(self):
+        """数据有变化时清空查询缓存，正在加载的第一页也不再记入缓存，下次查询重新统计记录数"""
+        self._search_cache.clear()
+        self._search_cache_key = None
+        self._data_version += 1
+    
+    def _start_search(self, query, month_start=None):
+        """启动后台查询线程；query为((第一页语句, 后续页语句), 参数)，month_start不为空时同时重新统计记录数"""
+        self._query_token += 1
+        threading.Thread(target=self._search_worker,
+            args=(self._query_token, query, self._search_after, month_start), daemon=True).start()
+    
+    def _search_worker(self, token, query, after, month_start):
+        """后台线程：执行查询并每200行回到Tk主线程插入一次，不访问任何Tk控件"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            
-            # 构建查询条件
-            conditions = []
-            params = []
-            
-            if search_name:
-                conditions.append("patient_name LIKE ?")
-                params.append(f'%{search_name}%')
-            
-            if start_date:
-                conditions.append("DATE(create_time) >= ?")
-                params.append(start_date)
-            
-            if end_date:
-                conditions.append("DATE(create_time) <= ?")
-                params.append(end_date)
-            
-            # 构建SQL查询
-            if conditions:
-                query = f"SELECT id, patient_name, gender, age, create_time, diagnosis, prescription FROM prescriptions WHERE {' AND '.join(conditions)} ORDER BY create_time DESC"
-            else:
-                query = "SELECT id, patient_name, gender, age, create_time, diagnosis, prescription FROM prescriptions ORDER BY create_time DESC"
-            
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            # 获取统计信息
-            cursor.execute("SELECT COUNT(*) FROM prescriptions")
-            total_count = cursor.fetchone()[0]
-            
-            # 获取本月记录数
-            current_month_start = now.replace(day=1).strftime("%Y-%m-%d")
-            cursor.execute("SELECT COUNT(*) FROM prescriptions WHERE DATE(create_time) >= ?", (current_month_start,))
-            month_count = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            # 更新统计信息
-            self.stats_label.config(text=f"总记录数：{total_count} | 本月记录：{month_count} | 当前显示：{len(rows)}")
-            
-            # 清空并重新填充表格
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            for row in rows:
-                prescription_short = row[6][:50] + "..." if len(row[6]) > 50 else row[6]
-                # 格式化日期显示
-                date_str = row[4][:10] if row[4] else ""
-                self.tree.insert("", "end", values=(row[0], row[1], row[2] or "", row[3] or "", date_str, row[5] or "", prescription_short), tags=(row[0],))
+            with self._search_lock:
+                if token != self._query_token:
+                    return
+                if self._search_conn is None:
+                    self._search_conn = sqlite3.connect(self.db_file, check_same_thread=False, cached_statements=256)
+                    self._search_conn.row_factory = sqlite3.Row
+                    self._search_conn.execute("PRAGMA query_only=ON")
+                cursor = self._search_conn.cursor()
+                
+                stats = None
+                if month_start is not None:
+                    # 总记录数和本月记录数在一条语句中统计
+                    cursor.execute(SQL_COUNT_STATS, (month_start,))
+                    total_count, month_count = cursor.fetchone()
+                    stats = f"总记录数：{total_count} | 本月记录：{month_count}"
                 
+                # 多取一行用来判断是否还有下一页
+                (first_sql, next_sql), params = query
+                if after is None:
+                    cursor.execute(first_sql, params + (SEARCH_PAGE_SIZE + 1,))
+                else:
+                    create_time, row_id = after
+                    cursor.execute(next_sql, params + (create_time, create_time, row_id, SEARCH_PAGE_SIZE + 1))
+                batch = cursor.fetchmany(200)
+                self._post_to_ui(self._begin_search_page, token, query, stats)
+                
+                count = 0
+                while batch:
+                    if token != self._query_token:
+                        return
+                    self._post_to_ui(self._append_search_rows, token, batch[:SEARCH_PAGE_SIZE - count])
+                    count += len(batch)
+                    batch = cursor.fetchmany(200)
+                self._post_to_ui(self._finish_search_page, token, count > SEARCH_PAGE_SIZE)
         except Exception as e:
-            messagebox.showerror("错误", f"查询失败：{e}")
+            self._post_to_ui(self._search_failed, token, e)
+    
+    def _post_to_ui(self, callback, *args):
+        """从后台线程把回调交给Tk主线程执行"""
+        self._ui_queue.put((callback, args))
+    
+    def _drain_ui_queue(self):
+        """Tk主线程中执行：依次执行后台线程送回的回调，然后稍后再检查"""
+        try:
+            while True:
+                try:
+                    callback, args = self._ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                callback(*args)
+        finally:
+            self.root.after(50, self._drain_ui_queue)
+    
+    def _begin_search_page(self, token, query, stats):
+        if token != self._query_token:
+            return
+        self._search_query = query
+        if stats is not None:
+            self._stats_prefix = stats
+            self._stats_key = self._pending_stats_key
+        self._update_search_stats()
+    
+    def _append_search_rows(self, token, rows):
+        if token != self._query_token:
+            return
+        tree = self.tree
+        for row in rows:
+            iid = str(row['id'])
+            # 同一条记录已在列表中时跳过，重复的iid会让insert抛出TclError
+            if tree.exists(iid):
+                continue
+            tree.insert("", "end", iid=iid, values=(row['id'], row['patient_name'], row['gender'] or "",
+                row['age'] or "", row['create_date'] or "", row['diagnosis'] or "", row['summary']))
+            self._search_count += 1
+        if self._search_cache_key is not None:
+            self._search_page_rows.extend(rows)
+        if rows:
+            self._search_after = (rows[-1]['create_time'], rows[-1]['id'])
+        self._update_search_stats()
+    
+    def _finish_search_page(self, token, has_more):
+        if token != self._query_token:
+            return
+        self._search_has_more = has_more
+        self.load_more_btn.config(state="normal" if has_more else "disabled")
+        if self._search_cache_key is not None:
+            # 第一页加载完成，记入缓存
+            self._search_cache[self._search_cache_key] = (
+                self._search_query, self._search_page_rows, has_more, self._stats_prefix)
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+            self._search_cache_key = None
+    
+    def _search_failed(self, token, error):
+        if token != self._query_token:
+            return
+        messagebox.showerror("错误", f"查询失败：{error}")
+    
+    def _update_search_stats(self):
+        # 更新统计信息
+        self.stats_label.config(text=f"{self._stats_prefix} | 当前显示：{self._search_count}")
+    
+    def load_more_prescriptions(self):
+        """在列表末尾追加下一页查询结果"""
+        if self._search_query is None:
+            return
+        self._search_has_more = False
+        self.load_more_btn.config(state="disabled")
+        # 后续页不缓存
+        self._search_cache_key = None
+        self._start_search(self._search_query)
     
     def load_all_prescriptions(self):
         self.search_entry.delete(0, tk.END)
-        self.search_prescriptions()
+        self.schedule_search()
     
     def view_prescription_detail(self, event=None):
         selection = self.tree.selection()
         if not selection:
             messagebox.showwarning("提示", "请先选择一条记录！")
             return
-        item = selection[0]
-        prescription_id = self.tree.item(item, "tags")[0]
+        # 行的iid就是处方ID
+        prescription_id = int(selection[0])
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time FROM prescriptions WHERE id = ?", (prescription_id,))
-            row = cursor.fetchone()
-            conn.close()
+            row = self.conn.execute(SQL_GET_BY_ID, (prescription_id,)).fetchone()
             if row:
                 # 创建现代化的详情窗口
                 detail_window = tk.Toplevel(self.root)
@@ -1563,114 +2336,85 @@ class PrescriptionSystem:
                 main_frame.pack(fill="both", expand=True)
                 
                 # 标题
-                title_label = tk.Label(main_frame, text="处方详情", font=("Microsoft YaHei", 18, "bold"), fg="#2c3e50")
+                title_label = ttk.Label(main_frame, text="处方详情", style="Title.TLabel")
                 title_label.pack(pady=(0, 20))
                 
                 # 患者信息框架
                 patient_frame = tk.Frame(main_frame, bg="#f0f0f0", relief="groove", bd=2)
                 patient_frame.pack(fill="x", pady=10)
                 # 添加患者信息标签
-                patient_label = tk.Label(patient_frame, text="  患者信息  ", font=("Microsoft YaHei", 10, "bold"), bg="#f0f0f0", fg="#2c3e50")
+                patient_label = ttk.Label(patient_frame, text="  患者信息  ", style="Section.TLabel")
                 patient_label.pack(anchor="w", padx=5)
                 # 添加内容框架
                 patient_content = tk.Frame(patient_frame, bg="#f0f0f0", padx=15, pady=5)
                 patient_content.pack(fill="x")
                 
-                # 患者信息 - 使用不同颜色
-                info_frame = tk.Frame(patient_content, bg="#f0f0f0")
-                info_frame.pack(fill="x")
-                
+                # 患者信息 - 使用不同颜色；每个区块内的标签直接用grid排成行，不再每行套一个Frame
                 # 姓名 - 蓝色
-                name_frame = tk.Frame(info_frame, bg="#f0f0f0")
-                name_frame.pack(fill="x", pady=5)
-                tk.Label(name_frame, text="姓名：", font=("Microsoft YaHei", 12, "bold"), fg="#3498db", width=10, anchor="w").pack(side="left")
-                tk.Label(name_frame, text=row[0], font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
-                
+                self._detail_row(patient_content, 0, "姓名：", "#3498db", row['patient_name'])
                 # 性别和年龄 - 绿色
-                gender_age_frame = tk.Frame(info_frame, bg="#f0f0f0")
-                gender_age_frame.pack(fill="x", pady=5)
-                tk.Label(gender_age_frame, text="性别：", font=("Microsoft YaHei", 12, "bold"), fg="#27ae60", width=10, anchor="w").pack(side="left")
-                tk.Label(gender_age_frame, text=row[1] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
-                tk.Label(gender_age_frame, text="  年龄：", font=("Microsoft YaHei", 12, "bold"), fg="#27ae60", anchor="w").pack(side="left")
-                tk.Label(gender_age_frame, text=row[2] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
-                
+                self._detail_row(patient_content, 1, "性别：", "#27ae60", row['gender'] or "未填写", span=1)
+                ttk.Label(patient_content, text="  年龄：", style="Key.TLabel", foreground="#27ae60", anchor="w").grid(row=1, column=2, sticky="w", pady=5)
+                ttk.Label(patient_content, text=row['age'] or "未填写", style="Val.TLabel", anchor="w").grid(row=1, column=3, sticky="w", pady=5)
                 # 电话 - 紫色
-                phone_frame = tk.Frame(info_frame, bg="#f0f0f0")
-                phone_frame.pack(fill="x", pady=5)
-                tk.Label(phone_frame, text="电话：", font=("Microsoft YaHei", 12, "bold"), fg="#9b59b6", width=10, anchor="w").pack(side="left")
-                tk.Label(phone_frame, text=row[3] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
-                
+                self._detail_row(patient_content, 2, "电话：", "#9b59b6", row['phone'] or "未填写")
                 # 就诊日期 - 橙色
-                date_frame = tk.Frame(info_frame, bg="#f0f0f0")
-                date_frame.pack(fill="x", pady=5)
-                tk.Label(date_frame, text="就诊日期：", font=("Microsoft YaHei", 12, "bold"), fg="#e67e22", width=10, anchor="w").pack(side="left")
-                tk.Label(date_frame, text=row[9], font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
+                self._detail_row(patient_content, 3, "就诊日期：", "#e67e22", row['create_time'])
                 
                 # 诊断信息框架
                 diagnosis_frame = tk.Frame(main_frame, bg="#f0f0f0", relief="groove", bd=2)
                 diagnosis_frame.pack(fill="x", pady=10)
                 # 添加诊断信息标签
-                diagnosis_label = tk.Label(diagnosis_frame, text="  诊断信息  ", font=("Microsoft YaHei", 10, "bold"), bg="#f0f0f0", fg="#2c3e50")
+                diagnosis_label = ttk.Label(diagnosis_frame, text="  诊断信息  ", style="Section.TLabel")
                 diagnosis_label.pack(anchor="w", padx=5)
                 # 添加内容框架
                 diagnosis_content = tk.Frame(diagnosis_frame, bg="#f0f0f0", padx=15, pady=5)
                 diagnosis_content.pack(fill="x")
                 
                 # 中医辨证 - 红色
-                diagnosis_text_frame = tk.Frame(diagnosis_content, bg="#f0f0f0")
-                diagnosis_text_frame.pack(fill="x")
-                tk.Label(diagnosis_text_frame, text="中医辨证：", font=("Microsoft YaHei", 12, "bold"), fg="#e74c3c", width=10, anchor="nw").pack(side="left")
-                diagnosis_label = tk.Label(diagnosis_text_frame, text=row[4] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", justify="left", anchor="nw")
-                diagnosis_label.pack(side="left", fill="x", expand=True)
+                diagnosis_content.grid_columnconfigure(1, weight=1)
+                ttk.Label(diagnosis_content, text="中医辨证：", style="Key.TLabel", foreground="#e74c3c", width=10, anchor="nw").grid(row=0, column=0, sticky="nw")
+                ttk.Label(diagnosis_content, text=row['diagnosis'] or "未填写", style="Val.TLabel", justify="left", anchor="nw").grid(row=0, column=1, sticky="new")
                 
                 # 处方信息框架
                 prescription_frame = tk.Frame(main_frame, bg="#f0f0f0", relief="groove", bd=2)
                 prescription_frame.pack(fill="both", expand=True, pady=10)
                 # 添加处方信息标签
-                prescription_label = tk.Label(prescription_frame, text="  处方信息  ", font=("Microsoft YaHei", 10, "bold"), bg="#f0f0f0", fg="#2c3e50")
+                prescription_label = ttk.Label(prescription_frame, text="  处方信息  ", style="Section.TLabel")
                 prescription_label.pack(anchor="w", padx=5)
                 # 添加内容框架
                 prescription_content = tk.Frame(prescription_frame, bg="#f0f0f0", padx=15, pady=5)
                 prescription_content.pack(fill="both", expand=True)
                 
                 # 处方内容 - 深蓝色
-                prescription_text_frame = tk.Frame(prescription_content, bg="#f0f0f0")
-                prescription_text_frame.pack(fill="both", expand=True)
-                tk.Label(prescription_text_frame, text="处方内容：", font=("Microsoft YaHei", 12, "bold"), fg="#2980b9", width=10, anchor="nw").pack(side="left")
+                prescription_content.grid_columnconfigure(1, weight=1)
+                prescription_content.grid_rowconfigure(0, weight=1)
+                ttk.Label(prescription_content, text="处方内容：", style="Key.TLabel", foreground="#2980b9", width=10, anchor="nw").grid(row=0, column=0, sticky="nw")
                 
                 # 处方内容文本框
-                prescription_text = tk.Text(prescription_text_frame, height=8, width=50, font=("Microsoft YaHei", 11), wrap=tk.WORD, relief="solid", borderwidth=1, bg="#f0f0f0")
-                prescription_text.pack(side="left", fill="both", expand=True, padx=(10, 0))
-                prescription_text.insert("1.0", row[5] or "")
+                prescription_text = tk.Text(prescription_content, height=8, width=50, font=("Microsoft YaHei", 11), wrap=tk.WORD, relief="solid", borderwidth=1, bg="#f0f0f0")
+                prescription_text.grid(row=0, column=1, sticky="nsew", padx=(10, 0))
+                prescription_text.insert("1.0", row['prescription'] or "")
                 prescription_text.config(state="disabled")
                 
                 # 用法信息 - 棕色
-                usage_frame = tk.Frame(prescription_content, bg="#f0f0f0")
-                usage_frame.pack(fill="x", pady=(10, 0))
-                tk.Label(usage_frame, text="用法：", font=("Microsoft YaHei", 12, "bold"), fg="#8e44ad", width=10, anchor="w").pack(side="left")
-                tk.Label(usage_frame, text=row[6] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
+                ttk.Label(prescription_content, text="用法：", style="Key.TLabel", foreground="#8e44ad", width=10, anchor="w").grid(row=1, column=0, sticky="w", pady=(10, 0))
+                ttk.Label(prescription_content, text=row['usage'] or "未填写", style="Val.TLabel", anchor="w").grid(row=1, column=1, sticky="w", pady=(10, 0))
                 
                 # 医生信息框架
                 doctor_frame = tk.Frame(main_frame, bg="#f0f0f0", relief="groove", bd=2)
                 doctor_frame.pack(fill="x", pady=10)
                 # 添加医生信息标签
-                doctor_label = tk.Label(doctor_frame, text="  医生信息  ", font=("Microsoft YaHei", 10, "bold"), bg="#f0f0f0", fg="#2c3e50")
+                doctor_label = ttk.Label(doctor_frame, text="  医生信息  ", style="Section.TLabel")
                 doctor_label.pack(anchor="w", padx=5)
                 # 添加内容框架
                 doctor_content = tk.Frame(doctor_frame, bg="#f0f0f0", padx=15, pady=5)
                 doctor_content.pack(fill="x")
                 
                 # 开方医生 - 青色
-                doctor_info_frame = tk.Frame(doctor_content, bg="#f0f0f0")
-                doctor_info_frame.pack(fill="x")
-                tk.Label(doctor_info_frame, text="开方医生：", font=("Microsoft YaHei", 12, "bold"), fg="#16a085", width=10, anchor="w").pack(side="left")
-                tk.Label(doctor_info_frame, text=row[7] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
-                
+                self._detail_row(doctor_content, 0, "开方医生：", "#16a085", row['doctor'] or "未填写", pady=0)
                 # 医生电话 - 深绿色
-                doctor_phone_frame = tk.Frame(doctor_content, bg="#f0f0f0")
-                doctor_phone_frame.pack(fill="x", pady=5)
-                tk.Label(doctor_phone_frame, text="医生电话：", font=("Microsoft YaHei", 12, "bold"), fg="#27ae60", width=10, anchor="w").pack(side="left")
-                tk.Label(doctor_phone_frame, text=row[8] or "未填写", font=("Microsoft YaHei", 12), fg="#2c3e50", anchor="w").pack(side="left")
+                self._detail_row(doctor_content, 1, "医生电话：", "#27ae60", row['doctor_phone'] or "未填写")
                 
                 # 按钮框架
                 btn_frame = tk.Frame(main_frame, bg="#f0f0f0")
@@ -1687,75 +2431,56 @@ class PrescriptionSystem:
         except Exception as e:
             messagebox.showerror("错误", f"获取详情失败：{e}")
     
+    def init_styles(self):
+        """启动时定义一次详情窗口共用的标签样式，各标签只指定样式名（字段名的颜色各不相同，单独指定）"""
+        style = ttk.Style(self.root)
+        bg = "#f0f0f0"
+        style.configure("Title.TLabel", font=("Microsoft YaHei", 18, "bold"), foreground="#2c3e50", background=bg)
+        style.configure("Section.TLabel", font=("Microsoft YaHei", 10, "bold"), foreground="#2c3e50", background=bg)
+        style.configure("Key.TLabel", font=("Microsoft YaHei", 12, "bold"), background=bg)
+        style.configure("Val.TLabel", font=("Microsoft YaHei", 12), foreground="#2c3e50", background=bg)
+    
+    def _detail_row(self, parent, row, key, color, value, span=3, pady=5):
+        """详情窗口中的一行：彩色字段名 + 字段值，直接grid到区块的内容框架中"""
+        ttk.Label(parent, text=key, style="Key.TLabel", foreground=color, width=10, anchor="w").grid(row=row, column=0, sticky="w", pady=pady)
+        ttk.Label(parent, text=value, style="Val.TLabel", anchor="w").grid(row=row, column=1, columnspan=span, sticky="w", pady=pady)
+    
     def print_prescription_by_id(self, prescription_id):
         """根据ID打印处方"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time FROM prescriptions WHERE id = ?", (prescription_id,))
-            row = cursor.fetchone()
-            conn.close()
+            row = self.conn.execute(SQL_GET_BY_ID, (prescription_id,)).fetchone()
             if row:
-                # 填充表单
-                self.name_entry.delete(0, tk.END)
-                self.name_entry.insert(0, row[0])
-                self.gender_var.set(row[1] or "男")
-                self.age_entry.delete(0, tk.END)
-                self.age_entry.insert(0, row[2] or "")
-                self.phone_entry_patient.delete(0, tk.END)
-                self.phone_entry_patient.insert(0, row[3] or "")
-                self.diagnosis_entry.delete(0, tk.END)
-                self.diagnosis_entry.insert(0, row[4] or "")
-                self.prescription_text.delete("1.0", tk.END)
-                self.prescription_text.insert("1.0", row[5] or "")
-                self.usage_entry.delete(0, tk.END)
-                self.usage_entry.insert(0, row[6] or "水煎服，每日一剂，分早晚两次服用")
-                
-                # 更新预览
-                self.update_preview()
-                
-                # 生成并打印文档
-                docx_file = self.generate_receipt_docx()
-                if docx_file:
-                    if messagebox.askyesno("打印", f"处方已生成：\n{docx_file}\n\n是否打印？"):
-                        self.print_docx(docx_file)
+                self._load_prescription_into_form(row)
+                # 先确认再生成并打印文档，取消时不再生成小票文件
+                if messagebox.askyesno("打印", f"是否打印 {row['patient_name']} 的处方？"):
+                    self.generate_receipt_docx(on_saved=self.print_docx)
         except Exception as e:
             messagebox.showerror("错误", f"打印失败：{e}")
-
+    
+    def _load_prescription_into_form(self, row):
+        """把一条历史处方填入录入表单并刷新预览"""
+        self.name_entry.delete(0, tk.END)
+        self.name_entry.insert(0, row['patient_name'])
+        self.gender_var.set(row['gender'] or "男")
+        self.age_entry.delete(0, tk.END)
+        self.age_entry.insert(0, row['age'] or "")
+        self.phone_entry_patient.delete(0, tk.END)
+        self.phone_entry_patient.insert(0, row['phone'] or "")
+        self.diagnosis_entry.delete(0, tk.END)
+        self.diagnosis_entry.insert(0, row['diagnosis'] or "")
+        self.prescription_text.delete("1.0", tk.END)
+        self.prescription_text.insert("1.0", row['prescription'] or "")
+        self.usage_entry.delete(0, tk.END)
+        self.usage_entry.insert(0, row['usage'] or "水煎服，每日一剂，分早晚两次服用")
+        self.update_preview()
+    
     def print_selected_prescription(self):
         selection = self.tree.selection()
         if not selection:
             messagebox.showwarning("提示", "请先选择一条记录！")
             return
-        item = selection[0]
-        prescription_id = self.tree.item(item, "tags")[0]
-        try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time FROM prescriptions WHERE id = ?", (prescription_id,))
-            row = cursor.fetchone()
-            conn.close()
-            if row:
-                self.name_entry.delete(0, tk.END)
-                self.name_entry.insert(0, row[0])
-                self.gender_var.set(row[1] or "男")
-                self.age_entry.delete(0, tk.END)
-                self.age_entry.insert(0, row[2] or "")
-                self.phone_entry_patient.delete(0, tk.END)
-                self.phone_entry_patient.insert(0, row[3] or "")
-                self.diagnosis_entry.delete(0, tk.END)
-                self.diagnosis_entry.insert(0, row[4] or "")
-                self.prescription_text.delete("1.0", tk.END)
-                self.prescription_text.insert("1.0", row[5] or "")
-                self.usage_entry.delete(0, tk.END)
-                self.usage_entry.insert(0, row[6] or "水煎服，每日一剂，分早晚两次服用")
-                self.update_preview()
-                docx_file = self.generate_receipt_docx()
-                if docx_file:
-                    if messagebox.askyesno("打印", f"处方已生成：\n{docx_file}\n\n是否打印？"):
-                        self.print_docx(docx_file)
-        except Exception as e:
-            messagebox.showerror("错误", f"打印失败：{e}")
+        # 行的iid就是处方ID
+        self.print_prescription_by_id(int(selection[0]))
     
     def delete_prescription(self):
         selection = self.tree.selection()
@@ -1764,42 +2489,56 @@ class PrescriptionSystem:
             return
         if not messagebox.askyesno("确认", "确定要删除这条记录吗？"):
             return
-        item = selection[0]
-        prescription_id = self.tree.item(item, "tags")[0]
+        # 行的iid就是处方ID
+        prescription_id = int(selection[0])
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM prescriptions WHERE id = ?", (prescription_id,))
-            conn.commit()
-            conn.close()
+            with self.conn:
+                self.conn.execute(SQL_DELETE, (prescription_id,))
+            self._invalidate_search_cache()
             self.completion_panel.load_words_from_database()
             messagebox.showinfo("成功", "记录已删除！")
-            self.search_prescriptions()
+            self.schedule_search()
         except Exception as e:
             messagebox.showerror("错误", f"删除失败：{e}")
     
     def export_data(self):
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT patient_name, gender, age, phone, diagnosis, prescription, usage, doctor, doctor_phone, create_time FROM prescriptions ORDER BY create_time DESC")
-            rows = cursor.fetchall()
+            has_data = self.conn.execute("SELECT 1 FROM prescriptions LIMIT 1").fetchone() is not None
+        except Exception as e:
+            messagebox.showerror("错误", f"导出失败：{e}")
+            return
+        if not has_data:
+            messagebox.showinfo("提示", "没有数据可导出！")
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV文件", "*.csv"), ("所有文件", "*.*")], title="导出数据")
+        if not filename:
+            return
+        # 读取全部记录和写文件在线程池中执行，导出期间界面保持响应
+        future = self._io_pool.submit(self._export_worker, filename)
+        future.add_done_callback(lambda f: self._post_to_ui(self._on_export_done, f))
+    
+    def _export_worker(self, filename):
+        """线程池中执行：用单独的连接读取全部记录写入CSV，不访问任何Tk控件"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.execute(SQL_EXPORT)
+            cursor.arraysize = 1000
+            # csv模块负责引号、逗号和换行的转义；记录直接从游标逐行写出，1MB写缓冲
+            with open(filename, "w", encoding="utf-8-sig", newline="", buffering=1 << 20) as f:
+                writer = csv.writer(f)
+                writer.writerow(["姓名", "性别", "年龄", "电话", "中医辨证", "处方", "用法", "医生", "医生电话", "日期"])
+                writer.writerows(cursor)
+        finally:
             conn.close()
-            if not rows:
-                messagebox.showinfo("提示", "没有数据可导出！")
-                return
-            filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV文件", "*.csv"), ("所有文件", "*.*")], title="导出数据")
-            if not filename:
-                return
-            with open(filename, "w", encoding="utf-8-sig") as f:
-                f.write("姓名,性别,年龄,电话,中医辨证,处方,用法,医生,医生电话,日期\n")
-                for row in rows:
-                    line = ",".join([f'"{str(field)}"' for field in row])
-                    f.write(line + "\n")
-            messagebox.showinfo("成功", f"数据已导出到：\n{filename}")
+        return filename
+    
+    def _on_export_done(self, future):
+        try:
+            filename = future.result()
         except Exception as e:
             messagebox.showerror("错误", f"导出失败：{e}")
-
+            return
+        messagebox.showinfo("成功", f"数据已导出到：\n{filename}")
 
 def main():
     root = tk.Tk()